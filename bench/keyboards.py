@@ -0,0 +1,117 @@
+# Klaviatura keshining mikrobenchmarki: har bir klaviatura quruvchisi va uni
+# ishlatadigan handlerlarning bitta chaqiruv narxi keshsiz va kesh bilan.
+#
+#   python bench/keyboards.py [takrorlar_soni]
+import asyncio
+import os
+import shutil
+import sys
+import time
+from types import SimpleNamespace
+
+from load import ROOT, prepare_workdir
+
+# bot.log, users.json va boshqa ish fayllari asl nusxada o'zgarmasligi uchun
+WORKDIR = prepare_workdir()
+
+import main  # noqa: E402
+from aiogram.fsm.context import FSMContext  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+
+main.content_store.load()
+
+BUILDERS = ("get_main_menu", "get_dict_menu", "get_grammar_menu", "get_learning_navigation")
+CACHED = {name: getattr(main, name) for name in BUILDERS}
+UNCACHED = {name: fn.__wrapped__ for name, fn in CACHED.items()}
+
+
+def use(builders):
+    for name, fn in builders.items():
+        setattr(main, name, fn)
+
+
+def bench(fn, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number * 1e6
+
+
+async def bench_async(fn, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        await fn()
+    return (time.perf_counter() - start) / number * 1e6
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def make_message(text):
+    return SimpleNamespace(
+        text=text,
+        from_user=SimpleNamespace(id=1, username="bench"),
+        chat=SimpleNamespace(id=1),
+        answer=_noop,
+    )
+
+
+async def bench_handlers(number):
+    storage = MemoryStorage()
+    state = FSMContext(storage, StorageKey(bot_id=1, chat_id=1, user_id=1))
+    results = {}
+
+    async def start():
+        await main.start_handler(make_message("/start"), state)
+
+    async def dict_next_page():
+        await state.set_state(main.QuizStates.choosing_dict)
+        await state.update_data(dict_page=0)
+        await main.choose_dict_handler(make_message("➡️ Keyingi sahifa"), state)
+
+    async def grammar_menu():
+        await main.quiz_menu_handler(make_message("📚 Grammatika"), state)
+
+    pool_id = main.grammar_pool_id(main.GRAMMAR_NAMES[0])
+
+    async def learning_page():
+        await state.update_data(section="Grammar", selected_category=main.GRAMMAR_NAMES[0], pool_id=pool_id, current_page=1)
+        await main.show_learning_page(make_message("➡️ Keyingi sahifa"), state)
+
+    for name, fn in (("start_handler", start), ("choose_dict_handler", dict_next_page),
+                     ("quiz_menu_handler", grammar_menu), ("show_learning_page", learning_page)):
+        results[name] = await bench_async(fn, number)
+    return results
+
+
+def main_bench():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    builder_calls = {
+        "get_main_menu": lambda: main.get_main_menu(False, False),
+        "get_dict_menu": lambda: main.get_dict_menu(0),
+        "get_grammar_menu": lambda: main.get_grammar_menu(0),
+        "get_learning_navigation": lambda: main.get_learning_navigation(1, 5),
+    }
+
+    use(UNCACHED)
+    before = {name: bench(fn, number) for name, fn in builder_calls.items()}
+    before.update(asyncio.run(bench_handlers(number // 10)))
+    use(CACHED)
+    main.clear_keyboard_cache()
+    main.warm_keyboard_cache()
+    after = {name: bench(fn, number) for name, fn in builder_calls.items()}
+    after.update(asyncio.run(bench_handlers(number // 10)))
+
+    print(f"{'':28}{'keshsiz, us':>14}{'kesh bilan, us':>16}{'tezlashish':>12}")
+    for name in before:
+        print(f"{name:28}{before[name]:14.2f}{after[name]:16.2f}{before[name] / after[name]:11.1f}x")
+
+
+if __name__ == "__main__":
+    try:
+        main_bench()
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(WORKDIR, ignore_errors=True)
@@ -0,0 +1,210 @@
+# Yuklama benchmarki: soxta Telegram yangilanishlari to'g'ridan-to'g'ri dp.feed_update
+# orqali beriladi, bot sessiyasi esa tarmoqqa chiqmasdan chiquvchi so'rovlarni sanaydi.
+# N ta foydalanuvchi bir vaqtda /start -> Quiz boshlash -> bo'lim -> savollar soni ->
+# javoblar oqimini bajaradi (juftlari lug'at, toqlari tasodifiy savollar bo'limi).
+#
+# Natija: yangilanish/sekund, yangilanish ishlov berish vaqti (p50/p99), har bir
+# yangilanishga to'g'ri keladigan Telegram API so'rovlari, xotira o'sishi va
+# handlerlar bo'yicha o'rtacha vaqt. --json bilan CI uchun bitta JSON qator chiqadi.
+#
+#   python bench/load.py --users 200 --questions 10
+#   STORAGE_BACKEND=sqlite FSM_STORAGE=sqlite python bench/load.py --json
+import argparse
+import asyncio
+import datetime
+import gc
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_USER_ID = 10_000_000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Dispatcher orqali yuklama benchmarki")
+    parser.add_argument("--users", type=int, default=100, help="bir vaqtdagi foydalanuvchilar soni")
+    parser.add_argument("--questions", type=int, default=10, help="har bir quizdagi savollar soni")
+    parser.add_argument("--rounds", type=int, default=1, help="har bir foydalanuvchi necha marta quiz ishlaydi")
+    parser.add_argument("--correct", type=float, default=0.7, help="to'g'ri javoblar ulushi")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="Python xotirasini aniq o'lchash (sekinroq)")
+    parser.add_argument("--json", action="store_true", help="natijani JSON ko'rinishida chiqarish")
+    return parser.parse_args()
+
+
+def prepare_workdir():
+    # users.json, bot.log va bazalar asl nusxada o'zgarmasligi uchun vaqtinchalik papka
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    for filename in ("dictionary.json", "grammar.json", "users.json", os.getenv("CONTENT_INDEX")):
+        if filename and os.path.exists(os.path.join(ROOT, filename)):
+            shutil.copy(os.path.join(ROOT, filename), workdir)
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("BOT_TOKEN", "123456:bench")
+    os.environ.setdefault("TIME_LIMIT", "3600")  # taymerlar rejalashtiriladi, lekin o'lchov paytida ishlamaydi
+    os.environ.setdefault("METRICS_LOG_INTERVAL", "0")
+    os.environ.setdefault("CONTENT_WATCH_INTERVAL", "0")
+    return workdir
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(args):
+    import logging
+
+    import main
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import SendMessage
+    from aiogram.types import Chat, Message, Update, User
+
+    logging.disable(logging.WARNING)
+    message_ids = itertools.count(1)
+    update_ids = itertools.count(1)
+    calls = Counter()
+
+    class Session(BaseSession):
+        async def make_request(self, bot, method, timeout=None):
+            calls[type(method).__name__] += 1
+            if isinstance(method, SendMessage):
+                return Message(
+                    message_id=next(message_ids), date=datetime.datetime.now(),
+                    chat=Chat(id=method.chat_id, type="private"), text=method.text
+                ).as_(bot)
+            return True
+
+        async def close(self):
+            pass
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+    main.bot.session = Session()
+    main.bot.session.middleware(main.metrics.observe_request)
+    await main.dp.emit_startup(bot=main.bot)
+    await main.content_store.wait_ready()
+
+    dictionaries = [
+        name for name in main.DICT_NAMES
+        if len(main.QUESTION_POOLS.get(main.dictionary_pool_id(name, "Easy"), ())) >= args.questions
+    ]
+    rng = random.Random(args.seed)
+    latencies = []
+
+    async def feed(user: User, text: str):
+        update = Update(update_id=next(update_ids), message=Message(
+            message_id=next(message_ids), date=datetime.datetime.now(),
+            chat=Chat(id=user.id, type="private"), from_user=user, text=text
+        ))
+        started = time.perf_counter()
+        await main.dp.feed_update(main.bot, update)
+        latencies.append(time.perf_counter() - started)
+
+    async def answer(user: User):
+        # To'g'ri javob FSM ma'lumotlaridan olinadi, xatosi - tasodifiy so'z
+        state = main.dp.fsm.get_context(main.bot, user.id, user.id)
+        user_data = await state.get_data()
+        pool = main.get_pool(user_data)
+        question_id = user_data["question_ids"][user_data.get("current", 0)]
+        if rng.random() < args.correct:
+            return str(pool[question_id][1])
+        return f"xato{rng.randrange(1000)}"
+
+    async def simulate(user_id: int):
+        user = User(id=user_id, is_bot=False, first_name="bench", username=f"bench{user_id}")
+        for _ in range(args.rounds):
+            await feed(user, "/start")
+            await feed(user, "🚀 Quiz boshlash")
+            if user_id % 2 == 0 and dictionaries:
+                await feed(user, "📖 Lug‘atlar")
+                await feed(user, f"📖 {rng.choice(dictionaries)}")
+                await feed(user, "✨ Oson daraja")
+            else:
+                await feed(user, "🎲 Tasodifiy savollar")
+            await feed(user, str(args.questions))
+            for _ in range(args.questions):
+                await feed(user, await answer(user))
+
+    gc.collect()
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = rss_kb()
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate(FIRST_USER_ID + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    rss_after = rss_kb()
+    traced = tracemalloc.get_traced_memory()[0] if args.tracemalloc else None
+    tracemalloc.stop()
+
+    handlers = {
+        name: {"count": hist.count, "mean_ms": hist.sum / hist.count * 1000}
+        for name, hist in main.metrics.handler_latency.items() if hist.count
+    }
+    await main.dp.emit_shutdown(bot=main.bot)
+    return {
+        "users": args.users,
+        "updates": len(latencies),
+        "seconds": elapsed,
+        "updates_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "calls_per_update": sum(calls.values()) / len(latencies),
+        "calls": dict(calls),
+        "rss_growth_kb": rss_after - rss_before,
+        "traced_kb": traced // 1024 if traced is not None else None,
+        "handlers": handlers,
+    }
+
+
+def report(result):
+    print(f"Foydalanuvchilar: {result['users']}, yangilanishlar: {result['updates']}, vaqt: {result['seconds']:.2f} s")
+    print(f"  {result['updates_per_sec']:.0f} yangilanish/sekund")
+    print(f"  ishlov berish vaqti: p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, o'rtacha {result['mean_ms']:.2f} ms")
+    print(f"  Telegram API so'rovlari: {result['calls_per_update']:.2f} ta/yangilanish "
+          f"({', '.join(f'{name}={count}' for name, count in sorted(result['calls'].items()))})")
+    memory = f"  xotira o'sishi: RSS {result['rss_growth_kb'] / 1024:.1f} MB"
+    if result["traced_kb"] is not None:
+        memory += f", Python obyektlari {result['traced_kb'] / 1024:.1f} MB"
+    print(memory)
+    print(f"  {'handler':24}{'soni':>8}{'o`rtacha, ms':>14}")
+    for name, stats in sorted(result["handlers"].items(), key=lambda item: -item[1]["count"]):
+        print(f"  {name:24}{stats['count']:8}{stats['mean_ms']:14.3f}")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    workdir = prepare_workdir()
+    try:
+        result = asyncio.run(run(arguments))
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    if arguments.json:
+        print(json.dumps(result))
+    else:
+        report(result)
@@ -0,0 +1,101 @@
+# Sovuq ishga tushish benchmarki: har bir o'lchov yangi Python jarayonida.
+#   import  - `import main` davomiyligi
+#   /start  - jarayon boshidan birinchi /start javobigacha (startup hooklari bilan)
+#   ready   - jarayon boshidan ma'lumotlar to'liq yuklanguncha
+# Telegram'ga so'rov yuborilmaydi: bot sessiyasi soxta sessiya bilan almashtiriladi.
+#
+#   python bench/startup.py [takrorlar_soni]
+#   CONTENT_INDEX=content.idx python bench/startup.py
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child():
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    os.chdir(sys.argv[2])
+    os.environ.setdefault("BOT_TOKEN", "123456:bench")
+    os.environ.setdefault("USERS_FLUSH_INTERVAL", "3600")
+
+    import asyncio
+    import logging
+
+    import main
+    imported = time.perf_counter()
+    logging.disable(logging.CRITICAL)
+
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import SendMessage
+    from aiogram.types import Chat, Message, Update, User
+
+    timings = {"import": imported - started}
+
+    class Session(BaseSession):
+        async def make_request(self, bot, method, timeout=None):
+            if isinstance(method, SendMessage) and "start" not in timings:
+                timings["start"] = time.perf_counter() - started
+            return Message(message_id=1, date=0, chat=Chat(id=method.chat_id, type="private"), text="").as_(bot)
+
+        async def close(self):
+            pass
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+    async def run():
+        main.bot.session = Session()
+        await main.dp.emit_startup(bot=main.bot)
+        user = User(id=1, is_bot=False, first_name="bench")
+        update = Update(update_id=1, message=Message(
+            message_id=1, date=0, chat=Chat(id=1, type="private"), from_user=user, text="/start"
+        ))
+        await main.dp.feed_update(main.bot, update)
+        await main.content_store.wait_ready()
+        timings["ready"] = time.perf_counter() - started
+        await main.dp.emit_shutdown(bot=main.bot)
+
+    asyncio.run(run())
+    print(json.dumps(timings))
+
+
+def main_bench():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    # Foydalanuvchilar fayli va bot.log o'zgarmasligi uchun nusxalar bilan ishlaymiz
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    for filename in ("dictionary.json", "grammar.json", "users.json", os.getenv("CONTENT_INDEX")):
+        if filename and os.path.exists(os.path.join(ROOT, filename)):
+            shutil.copy(os.path.join(ROOT, filename), workdir)
+
+    runs = []
+    for _ in range(number):
+        spawned = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", workdir],
+            check=True, capture_output=True, text=True
+        ).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        timings["process"] = time.perf_counter() - spawned
+        runs.append(timings)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    source = os.getenv("CONTENT_INDEX") or "dictionary.json + grammar.json"
+    print(f"Ma'lumot manbasi: {source}, takrorlar: {number}")
+    print(f"{'':10}{'median, ms':>12}{'min, ms':>10}{'max, ms':>10}")
+    for name in ("import", "start", "ready", "process"):
+        values = [run[name] * 1000 for run in runs]
+        print(f"{name:10}{statistics.median(values):12.1f}{min(values):10.1f}{max(values):10.1f}")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        child()
+    else:
+        main_bench()
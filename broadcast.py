@@ -0,0 +1,245 @@
+import asyncio
+import contextlib
+import logging
+import os
+from datetime import datetime
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from storage import load_json, save_to_json
+
+logger = logging.getLogger(__name__)
+
+# Token bucket: o'rtacha `rate` ta xabar/sekund, `capacity` gacha portlash.
+# Telegram RetryAfter qaytarsa, pause() bilan butun oqim to'xtatib turiladi.
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = None
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self._updated is not None:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        now = asyncio.get_running_loop().time()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+
+
+def _is_dead_chat(error: Exception):
+    error_msg = str(error).lower()
+    return isinstance(error, TelegramForbiddenError) or "blocked by user" in error_msg or "chat not found" in error_msg
+
+
+# Ommaviy xabar yuborish: cheklangan ishchilar soni, umumiy tezlik chegarasi,
+# RetryAfter'ga rioya qilish, o'chgan chatlarni oxirida bitta paketda o'chirish
+# va jarayonni checkpoint faylga yozib borish (qayta ishga tushganda davom etadi)
+class Broadcast:
+    def __init__(self, bot, registry, text: str, admin_chat_id: int, checkpoint_file: str = 'broadcast.json',
+                 workers: int = 8, rate: float = 25.0, progress_interval: float = 10.0, max_attempts: int = 3):
+        self.bot = bot
+        self.registry = registry
+        self.text = text
+        self.admin_chat_id = admin_chat_id
+        self.checkpoint_file = checkpoint_file
+        self.workers = workers
+        self.bucket = TokenBucket(rate)
+        self.progress_interval = progress_interval
+        self.max_attempts = max_attempts
+        self.started_at = datetime.now().isoformat()
+        self.total = 0
+        self.sent = 0
+        self.failed = 0
+        self.dead = set()
+        self.done_upto = None  # shu id gacha (shu jumladan) barcha foydalanuvchilar ishlangan
+        self.done_above = set()  # done_upto dan keyin navbatdan oldin yakunlanganlar (ko'pi bilan ishchilar navbati)
+        self.progress_message = None
+        self._last_report = None
+
+    @classmethod
+    async def resume(cls, bot, registry, checkpoint_file: str = 'broadcast.json', **kwargs):
+        if not os.path.exists(checkpoint_file):
+            return None
+        checkpoint = await load_json(checkpoint_file, {}) or {}
+        if not isinstance(checkpoint, dict) or not checkpoint.get('text'):
+            return None
+        broadcast = cls(bot, registry, checkpoint['text'], checkpoint['admin_chat_id'],
+                        checkpoint_file=checkpoint_file, **kwargs)
+        broadcast.started_at = checkpoint.get('started_at', broadcast.started_at)
+        broadcast.sent = checkpoint.get('sent', 0)
+        broadcast.failed = checkpoint.get('failed', 0)
+        broadcast.dead = set(checkpoint.get('dead', []))
+        broadcast.done_upto = checkpoint.get('done_upto')
+        broadcast.done_above = set(checkpoint.get('done_above', []))
+        return broadcast
+
+    async def save_checkpoint(self):
+        await save_to_json(self.checkpoint_file, {
+            'text': self.text,
+            'admin_chat_id': self.admin_chat_id,
+            'started_at': self.started_at,
+            'done_upto': self.done_upto,
+            'done_above': sorted(self.done_above),
+            'sent': self.sent,
+            'failed': self.failed,
+            'dead': sorted(self.dead)
+        })
+
+    async def _deliver(self, user_id: int):
+        # RetryAfter urinish hisoblanmaydi: cheklov tugaguncha kutib, qayta yuboriladi
+        attempt = 0
+        while attempt < self.max_attempts:
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=user_id, text=self.text, parse_mode="HTML")
+                return "sent"
+            except TelegramRetryAfter as e:
+                logger.warning(f"Telegram cheklovi: {e.retry_after} sekund kutilmoqda (ID={user_id})",
+                               extra={"rate_key": "broadcast.retry"})
+                self.bucket.pause(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                logger.warning(f"Xabar yuborishda vaqtinchalik xato: ID={user_id}, urinish {attempt}, Xato: {e}",
+                               extra={"rate_key": "broadcast.delivery"})
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                if _is_dead_chat(e):
+                    return "dead"
+                logger.error(f"Xabar yuborishda xato: ID={user_id}, Xato: {str(e).lower()}",
+                             extra={"rate_key": "broadcast.delivery"})
+                return "failed"
+        return "failed"
+
+    async def _worker(self, queue: asyncio.Queue, completed: dict, order: list):
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                seq, user_id = item
+                result = await self._deliver(user_id)
+                if result == "sent":
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                    if result == "dead":
+                        self.dead.add(user_id)
+                completed[seq] = user_id
+                self.done_above.add(user_id)
+                self._advance(completed, order)
+            finally:
+                queue.task_done()
+
+    def _advance(self, completed: dict, order: list):
+        # order[0] - hali yakunlanmagan eng kichik navbat raqami
+        if order[0] not in completed:
+            return
+        while order[0] in completed:
+            self.done_upto = completed.pop(order[0])
+            order[0] += 1
+        self.done_above = {user_id for user_id in self.done_above if user_id > self.done_upto}
+
+    async def _report_progress(self, final: bool = False):
+        processed = self.sent + self.failed
+        text = (
+            f"<b>📬 Xabar yuborish {'natijasi' if final else 'jarayoni'}:</b>\n"
+            f"✅ Muvaffaqiyatli: {self.sent} ta\n"
+            f"❌ Xato: {self.failed} ta\n"
+            f"🚫 O‘chirilgan: {len(self.dead)} ta\n"
+            f"📨 Ishlangan: {processed}/{self.total} ta"
+        )
+        if final:
+            text += f"\n👥 Jami foydalanuvchilar: {len(self.registry)} ta"
+        if text == self._last_report:
+            return
+        self._last_report = text
+        try:
+            if self.progress_message is None:
+                self.progress_message = await self.bot.send_message(self.admin_chat_id, text, parse_mode="HTML")
+            else:
+                await self.progress_message.edit_text(text, parse_mode="HTML")
+        except TelegramBadRequest as e:
+            logger.debug(f"Jarayon xabarini yangilab bo'lmadi: {e}")
+        except Exception as e:
+            logger.warning(f"Jarayon xabarini yuborib bo'lmadi: {e}", extra={"rate_key": "broadcast.progress"})
+
+    async def _progress_loop(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            try:
+                await self.save_checkpoint()
+                await self._report_progress()
+            except Exception as e:
+                logger.warning(f"Xabar yuborish jarayonini saqlab bo'lmadi: {e}", extra={"rate_key": "broadcast.progress"})
+
+    async def run(self):
+        self.total = self.sent + self.failed + await self._count_remaining()
+        logger.info(f"Xabar yuborish boshlandi. Jami foydalanuvchilar: {self.total}")
+        await self.save_checkpoint()
+        await self._report_progress()
+
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+        completed, order = {}, [0]
+        workers = [asyncio.create_task(self._worker(queue, completed, order)) for _ in range(self.workers)]
+        progress = asyncio.create_task(self._progress_loop())
+        try:
+            seq = 0
+            # Oldingi ishga tushishda yakunlanganlar qayta yuborilmaydi (ular sent/failed'da hisoblangan)
+            resumed = set(self.done_above)
+            async for user in self.registry.iter_users(after_id=self.done_upto):
+                if user['id'] in resumed:
+                    continue
+                await queue.put((seq, user['id']))
+                seq += 1
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            progress.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await progress
+            for task in workers:
+                task.cancel()
+            # To'xtatilgan bo'lsa ham, shu paytgacha ishlangan qism saqlanadi
+            await self.save_checkpoint()
+
+        if self.dead:
+            logger.warning(f"Foydalanuvchilar ro‘yxatdan o‘chirilmoqda: {len(self.dead)} ta")
+            self.registry.remove_many(self.dead)
+            await self.registry.flush()
+        await self._report_progress(final=True)
+        with contextlib.suppress(FileNotFoundError):
+            await asyncio.to_thread(os.remove, self.checkpoint_file)
+        logger.info(f"Xabar yuborish yakunlandi. Muvaffaqiyatli: {self.sent}, Xato: {self.failed}, O‘chirilgan: {len(self.dead)}")
+
+    async def _count_remaining(self):
+        if self.done_upto is None and not self.done_above:
+            return await self.registry.count()
+        count = 0
+        async for user in self.registry.iter_users(after_id=self.done_upto):
+            if user['id'] not in self.done_above:
+                count += 1
+        return count
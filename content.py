@@ -0,0 +1,498 @@
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_right
+from collections.abc import Sequence
+
+from matching import accepted_variants
+
+logger = logging.getLogger(__name__)
+
+RANDOM_POOL_ID = "random"
+
+def dictionary_pool_id(dict_name: str, level: str):
+    return f"dict:{dict_name}:{level}"
+
+def grammar_pool_id(grammar_name: str):
+    return f"grammar:{grammar_name}"
+
+# Yuqoridagilarning teskarisi: (tur, nom, daraja)
+def parse_pool_id(pool_id: str):
+    kind, _, rest = pool_id.partition(":")
+    if kind == "dict":
+        name, _, level = rest.rpartition(":")
+        return kind, name, level
+    return kind, rest or None, None
+
+# Savollar to'plami: ma'lumot yuklanganda bir marta quriladi va o'zgarmaydi.
+# FSM holatida faqat pool_id va savol indekslari saqlanadi.
+# accepted[i] - i-savol uchun qabul qilinadigan normallashtirilgan javoblar.
+class QuestionPool:
+    __slots__ = ("pool_id", "items", "accepted")
+
+    def __init__(self, pool_id: str, items, accepted=None):
+        self.pool_id = pool_id
+        self.items = tuple(items)
+        if accepted is None:
+            accepted = (accepted_variants(answer) for _, answer in self.items)
+        self.accepted = tuple(accepted)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index: int):
+        return self.items[index]
+
+def build_pools(data: dict):
+    pools = {}
+    random_items, random_accepted = [], []
+    for dict_name, levels in data["Dictionary"].items():
+        for level, words in levels.items():
+            pool = QuestionPool(dictionary_pool_id(dict_name, level), words.items())
+            pools[pool.pool_id] = pool
+            random_items.extend(pool.items)
+            random_accepted.extend(pool.accepted)
+    for grammar_name, questions in data["Grammar"].items():
+        pool = QuestionPool(grammar_pool_id(grammar_name), questions.items())
+        pools[pool.pool_id] = pool
+        random_items.extend(pool.items)
+        random_accepted.extend(pool.accepted)
+    pools[RANDOM_POOL_ID] = QuestionPool(RANDOM_POOL_ID, random_items, random_accepted)
+    logger.info(f"Savollar to'plamlari qurildi: {len(pools)} ta, tasodifiy savollar: {len(random_items)} ta")
+    return pools
+
+
+class ContentError(Exception):
+    pass
+
+# Ma'lumotlarning bitta versiyasi: o'zgarmas, shuning uchun quiz boshlangan
+# versiya bilan oxirigacha ishlash mumkin. version - fayllar mazmunining hash'i,
+# qayta ishga tushganda ham va bir nechta nusxada ham bir xil bo'ladi.
+class ContentSnapshot:
+    __slots__ = ("version", "data", "dict_names", "grammar_names", "pools", "_starts", "_pool_ids", "_questions")
+
+    def __init__(self, version: str, data: dict, dict_names: list, grammar_names: list, pools: dict = None):
+        self.version = version
+        self.data = data
+        self.dict_names = dict_names
+        self.grammar_names = grammar_names
+        self.pools = build_pools(data) if pools is None else pools
+        self._starts = None
+        self._pool_ids = None
+        self._questions = {}
+
+    def _layout(self):
+        # Tasodifiy to'plam - qolgan to'plamlarning shu tartibdagi ketma-ketligi
+        if self._starts is None:
+            starts, pool_ids, total = [], [], 0
+            for pool_id, pool in self.pools.items():
+                if pool_id != RANDOM_POOL_ID:
+                    starts.append(total)
+                    pool_ids.append(pool_id)
+                    total += len(pool)
+            self._starts, self._pool_ids = starts, pool_ids
+        return self._starts, self._pool_ids
+
+    def locate(self, pool_id: str, index: int):
+        # (asl to'plam, savolning undagi indeksi) - tasodifiy to'plamdagi savol uchun ham
+        if pool_id == RANDOM_POOL_ID:
+            starts, pool_ids = self._layout()
+            position = bisect_right(starts, index) - 1
+            pool_id, index = pool_ids[position], index - starts[position]
+        return pool_id, index
+
+    def origin(self, pool_id: str, index: int):
+        # (asl to'plam, savol matni)
+        pool_id, index = self.locate(pool_id, index)
+        return pool_id, self.pools[pool_id][index][0]
+
+    def _question_index(self, pool_id: str):
+        questions = self._questions.get(pool_id)
+        if questions is None:
+            pool = self.pools.get(pool_id) if pool_id != RANDOM_POOL_ID else None
+            questions = {item[0]: i for i, item in enumerate(pool.items)} if pool is not None else {}
+            self._questions[pool_id] = questions
+        return questions
+
+    def random_index(self, pool_id: str, question: str):
+        # origin() ning teskarisi: savolning tasodifiy to'plamdagi indeksi yoki None
+        index = self._question_index(pool_id).get(question)
+        if index is None:
+            return None
+        starts, pool_ids = self._layout()
+        return starts[pool_ids.index(pool_id)] + index
+
+    def index_of(self, pool_id: str, origin_pool_id: str, question: str):
+        # origin_pool_id dagi savolning pool_id to'plamidagi indeksi yoki None
+        if pool_id == RANDOM_POOL_ID:
+            return self.random_index(origin_pool_id, question)
+        if pool_id != origin_pool_id:
+            return None
+        return self._question_index(pool_id).get(question)
+
+def _validate_entries(entries, where: str):
+    if not isinstance(entries, dict):
+        raise ContentError(f"{where}: lug'at (obyekt) kutilgan edi")
+    for key, value in entries.items():
+        if not isinstance(value, (str, int, float)):
+            raise ContentError(f"{where} / {key}: javob matn bo'lishi kerak")
+
+def _read_bytes(filename: str):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def _parse_sources(dictionary_file: str, grammar_file: str):
+    data = {"Dictionary": {}, "Grammar": {}}
+    digest = hashlib.sha1()
+
+    try:
+        raw = _read_bytes(dictionary_file)
+        dictionary_data = json.loads(raw)
+    except FileNotFoundError:
+        raise ContentError(f"{dictionary_file} fayli topilmadi")
+    except json.JSONDecodeError as e:
+        raise ContentError(f"{dictionary_file} faylini dekodlashda xato: {e}")
+    if not isinstance(dictionary_data, dict):
+        raise ContentError(f"{dictionary_file}: lug'atlar obyekti kutilgan edi")
+    for dict_name, levels in dictionary_data.items():
+        if not isinstance(levels, dict):
+            raise ContentError(f"{dictionary_file} / {dict_name}: darajalar obyekti kutilgan edi")
+        for level, words in levels.items():
+            _validate_entries(words, f"{dictionary_file} / {dict_name} / {level}")
+        data["Dictionary"][dict_name] = levels
+    digest.update(raw)
+
+    try:
+        raw = _read_bytes(grammar_file)
+        grammar_data = json.loads(raw)
+        if not isinstance(grammar_data, dict):
+            raise ContentError(f"{grammar_file}: bo'limlar obyekti kutilgan edi")
+        for grammar_name, questions in grammar_data.items():
+            _validate_entries(questions, f"{grammar_file} / {grammar_name}")
+        data["Grammar"] = grammar_data
+        digest.update(raw)
+    except FileNotFoundError:
+        logger.warning(f"{grammar_file} fayli topilmadi, bo'sh Grammar ma'lumotlari ishlatiladi")
+    except json.JSONDecodeError as e:
+        # Yarim yozilgan fayl grammatika bo'limlarini o'chirib yubormasligi kerak
+        raise ContentError(f"{grammar_file} faylini dekodlashda xato: {e}")
+
+    return digest.hexdigest()[:12], data
+
+# Ma'lumotlarni yuklash
+def load_data(dictionary_file: str = 'dictionary.json', grammar_file: str = 'grammar.json'):
+    version, data = _parse_sources(dictionary_file, grammar_file)
+    dict_names = list(data["Dictionary"].keys())
+    grammar_names = list(data["Grammar"].keys())
+    logger.info(f"Yuklangan lug'atlar: {len(dict_names)}, grammatika bo'limlari: {len(grammar_names)}")
+    return ContentSnapshot(version, data, dict_names, grammar_names)
+
+
+# Katta lug'atlar uchun ixcham indeks fayli (python content.py build ...):
+#   sarlavha: magic, format, JSON uzunligi; JSON - versiya va har bir to'plamning
+#   ofsetlar jadvali joyi va savollar soni;
+#   har bir to'plam: (n+1) ta uint64 ofset, keyin "savol\0javob" yozuvlari (UTF-8).
+# Fayl mmap qilinadi: ishga tushganda faqat sarlavha o'qiladi, yozuvlar esa
+# kerak bo'lganda (savol berilganda, sahifa ko'rsatilganda) o'qiladi.
+INDEX_MAGIC = b"LUGATIDX"
+INDEX_FORMAT = 1
+_INDEX_HEADER = struct.Struct("<8sII")
+_OFFSET = struct.Struct("<Q")
+_SPAN = struct.Struct("<QQ")
+
+class _LazySequence(Sequence):
+    __slots__ = ("_length", "_getter")
+
+    def __init__(self, length: int, getter):
+        self._length = length
+        self._getter = getter
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._getter(i) for i in range(*index.indices(self._length)))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self._getter(index)
+
+# Indeks faylidagi to'plam: QuestionPool bilan bir xil interfeys, lekin savollar
+# va qabul qilinadigan javoblar faqat so'ralganda o'qiladi/hisoblanadi
+class MappedPool(QuestionPool):
+    __slots__ = ()
+
+    def __init__(self, pool_id: str, length: int, reader):
+        self.pool_id = pool_id
+        self.items = _LazySequence(length, reader)
+        self.accepted = _LazySequence(length, lambda index: accepted_variants(reader(index)[1]))
+
+def _entry_reader(mm, body: int, table: int):
+    def read(index: int):
+        start, end = _SPAN.unpack_from(mm, table + index * _OFFSET.size)
+        question, answer = mm[body + start:body + end].decode("utf-8").split("\0", 1)
+        return question, answer
+    return read
+
+def _concat_reader(pools: list):
+    starts, total = [], 0
+    for pool in pools:
+        starts.append(total)
+        total += len(pool)
+
+    def read(index: int):
+        position = bisect_right(starts, index) - 1
+        return pools[position][index - starts[position]]
+    return read, total
+
+def build_index(dictionary_file: str = 'dictionary.json', grammar_file: str = 'grammar.json',
+                index_file: str = 'content.idx'):
+    version, data = _parse_sources(dictionary_file, grammar_file)
+    header = {"version": version, "dictionaries": {}, "grammar": {}}
+    body = bytearray()
+
+    def pack(items, where: str):
+        entries = []
+        for question, answer in items.items():
+            if "\0" in str(question):
+                raise ContentError(f"{where} / {question!r}: savolda \\0 belgisi bo'lmasligi kerak")
+            entries.append(f"{question}\0{answer}".encode("utf-8"))
+        table = len(body)
+        offset = table + (len(entries) + 1) * _OFFSET.size
+        for entry in entries:
+            body.extend(_OFFSET.pack(offset))
+            offset += len(entry)
+        body.extend(_OFFSET.pack(offset))
+        for entry in entries:
+            body.extend(entry)
+        return [table, len(entries)]
+
+    for dict_name, levels in data["Dictionary"].items():
+        header["dictionaries"][dict_name] = {
+            level: pack(words, f"{dictionary_file} / {dict_name} / {level}") for level, words in levels.items()
+        }
+    for grammar_name, questions in data["Grammar"].items():
+        header["grammar"][grammar_name] = pack(questions, f"{grammar_file} / {grammar_name}")
+
+    raw_header = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    temp_file = f"{index_file}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_FORMAT, len(raw_header)))
+        f.write(raw_header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    # Eski fayl o'rniga atomar qo'yiladi: uni mmap qilgan jarayonlar eski nusxani o'qishda davom etadi
+    os.replace(temp_file, index_file)
+    logger.info(f"Indeks yaratildi: {index_file}, versiya {version}, hajmi {len(body) + len(raw_header)} bayt")
+    return version
+
+def load_index(index_file: str = 'content.idx'):
+    try:
+        with open(index_file, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        raise ContentError(f"{index_file} fayli topilmadi")
+    except ValueError:
+        raise ContentError(f"{index_file} fayli bo'sh")
+
+    try:
+        magic, index_format, header_length = _INDEX_HEADER.unpack_from(mm, 0)
+        if magic != INDEX_MAGIC or index_format != INDEX_FORMAT:
+            raise ContentError(f"{index_file}: noma'lum indeks formati")
+        body = _INDEX_HEADER.size + header_length
+        header = json.loads(mm[_INDEX_HEADER.size:body].decode("utf-8"))
+
+        def mapped(pool_id: str, table: int, count: int):
+            # Jadval oxiri fayl ichida bo'lishi kerak, aks holda fayl buzilgan
+            (end,) = _OFFSET.unpack_from(mm, body + table + count * _OFFSET.size)
+            if body + end > len(mm):
+                raise ContentError(f"{index_file}: {pool_id} to'plami fayl chegarasidan chiqib ketgan")
+            return MappedPool(pool_id, count, _entry_reader(mm, body, body + table))
+
+        pools, ordered = {}, []
+        outline = {"Dictionary": {}, "Grammar": {}}
+        for dict_name, levels in header["dictionaries"].items():
+            outline["Dictionary"][dict_name] = {}
+            for level, (table, count) in levels.items():
+                pool = mapped(dictionary_pool_id(dict_name, level), table, count)
+                outline["Dictionary"][dict_name][level] = count
+                pools[pool.pool_id] = pool
+                ordered.append(pool)
+        for grammar_name, (table, count) in header["grammar"].items():
+            pool = mapped(grammar_pool_id(grammar_name), table, count)
+            outline["Grammar"][grammar_name] = count
+            pools[pool.pool_id] = pool
+            ordered.append(pool)
+    except (struct.error, ValueError, KeyError, TypeError) as e:
+        raise ContentError(f"{index_file}: indeks fayli buzilgan ({e})")
+
+    reader, total = _concat_reader(ordered)
+    pools[RANDOM_POOL_ID] = MappedPool(RANDOM_POOL_ID, total, reader)
+    dict_names = list(outline["Dictionary"].keys())
+    grammar_names = list(outline["Grammar"].keys())
+    logger.info(
+        f"Indeks yuklandi: {index_file}, lug'atlar: {len(dict_names)}, "
+        f"grammatika bo'limlari: {len(grammar_names)}, savollar: {total} ta"
+    )
+    return ContentSnapshot(header["version"], outline, dict_names, grammar_names, pools)
+
+
+# Kontent ombori: joriy versiyani beradi, fayllarni kuzatib (yoki admin buyrug'i
+# bilan) yangi versiyani event loop'dan tashqarida o'qiydi, tekshiradi va bitta
+# almashtirish bilan joriy qiladi. Eski versiyalar keep_versions tagacha saqlanadi,
+# shuning uchun boshlangan quizlar o'z versiyasi bilan davom etadi.
+class ContentStore:
+    def __init__(self, dictionary_file: str = 'dictionary.json', grammar_file: str = 'grammar.json',
+                 watch_interval: float = 0, keep_versions: int = 8, index_file: str = None):
+        self.dictionary_file = dictionary_file
+        self.grammar_file = grammar_file
+        self.index_file = index_file
+        self.watch_interval = watch_interval
+        self.keep_versions = keep_versions
+        self.current = None
+        self.ready = asyncio.Event()
+        self._snapshots = {}
+        self._listeners = []
+        self._reload_lock = None
+        self._load_task = None
+        self._watch_task = None
+        self._mtimes = None
+
+    def on_reload(self, callback):
+        self._listeners.append(callback)
+        return callback
+
+    def _file_stamps(self):
+        # Indeks rejimida ham JSON manbalar kuzatiladi: ular o'zgarsa indeks qayta quriladi
+        stamps = []
+        sources = (self.dictionary_file, self.grammar_file) + ((self.index_file,) if self.index_file else ())
+        for filename in sources:
+            try:
+                st = os.stat(filename)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    @staticmethod
+    def _index_stale(stamps):
+        # Manbalar bo'lmasa (faqat indeks bilan yetkazilgan) indeks o'zi ishlatiladi
+        *sources, index = stamps
+        if not all(sources):
+            return False
+        return index is None or any(source[0] > index[0] for source in sources)
+
+    def _load(self):
+        stamps = self._file_stamps()
+        if self.index_file:
+            if self._index_stale(stamps):
+                build_index(self.dictionary_file, self.grammar_file, self.index_file)
+                stamps = self._file_stamps()
+            snapshot = load_index(self.index_file)
+        else:
+            snapshot = load_data(self.dictionary_file, self.grammar_file)
+        return snapshot, stamps
+
+    def _swap(self, snapshot: ContentSnapshot, stamps):
+        self._mtimes = stamps
+        if self.current is not None and snapshot.version == self.current.version:
+            return False
+        self._snapshots[snapshot.version] = snapshot
+        while len(self._snapshots) > self.keep_versions:
+            self._snapshots.pop(next(iter(self._snapshots)))
+        self.current = snapshot
+        for callback in self._listeners:
+            callback(snapshot)
+        self.ready.set()
+        return True
+
+    def load(self):
+        snapshot, stamps = self._load()
+        self._swap(snapshot, stamps)
+        return snapshot
+
+    async def reload(self):
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            snapshot, stamps = await asyncio.to_thread(self._load)
+            changed = self._swap(snapshot, stamps)
+        if changed:
+            logger.info(f"Ma'lumotlar yangilandi: versiya {snapshot.version}")
+        return snapshot, changed
+
+    async def wait_ready(self, timeout: float = None):
+        if self.current is not None:
+            return True
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def snapshot(self, version: str = None):
+        if version is None:
+            return self.current
+        return self._snapshots.get(version)
+
+    def pool(self, pool_id: str, version: str = None):
+        snapshot = self.snapshot(version)
+        if snapshot is None:
+            return None
+        return snapshot.pools.get(pool_id)
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                stamps = await asyncio.to_thread(self._file_stamps)
+                if stamps != self._mtimes:
+                    await self.reload()
+            except ContentError as e:
+                self._mtimes = stamps
+                logger.error(f"Yangi ma'lumotlar qabul qilinmadi: {e}")
+            except Exception as e:
+                logger.error(f"Ma'lumot fayllarini kuzatishda xato: {e}")
+
+    async def _initial_load(self):
+        try:
+            await self.reload()
+        except ContentError as e:
+            logger.critical(f"Ma'lumot fayllari yuklanmadi! {e}")
+
+    # Birinchi yuklash fonda boshlanadi: bot ishga tushishini kutib turmaydi
+    def start(self):
+        if self.current is None and self._load_task is None:
+            self._load_task = asyncio.create_task(self._initial_load())
+        if self.watch_interval > 0 and (self._watch_task is None or self._watch_task.done()):
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self):
+        for task in (self._load_task, self._watch_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._load_task = self._watch_task = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 5) or sys.argv[1] != "build":
+        print("Foydalanish: python content.py build [<dictionary.json> <grammar.json> <content.idx>]")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        build_index(*sys.argv[2:])
+    except ContentError as e:
+        logger.error(e)
+        sys.exit(1)
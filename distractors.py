@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+
+from content import RANDOM_POOL_ID
+
+logger = logging.getLogger(__name__)
+
+MAX_POSTING = 2000  # bundan ko'p javobda uchraydigan n-gramlar o'xshashlikka qo'shilmaydi
+NO_CANDIDATE = -1
+
+def _script(text: str):
+    for char in text:
+        if char.isalpha():
+            if "\u0400" <= char <= "\u04ff":
+                return "cyrillic"
+            return "latin" if char.isascii() or "\u00c0" <= char <= "\u024f" else "other"
+    return "other"
+
+def _ngrams(text: str, n: int = 3):
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+# Bitta to'plam uchun nomzodlar: candidates[i * k:(i + 1) * k] - i-savol javobiga
+# o'xshash boshqa javoblar indekslari (NO_CANDIDATE - bo'sh joy)
+class PoolDistractors:
+    __slots__ = ("k", "candidates")
+
+    def __init__(self, k: int, candidates: array):
+        self.k = k
+        self.candidates = candidates
+
+    def get(self, index: int):
+        return [c for c in self.candidates[index * self.k:(index + 1) * self.k] if c != NO_CANDIDATE]
+
+    @classmethod
+    def build(cls, answers: list, k: int):
+        # Har bir javob uchun bir xil yozuvdagi, uzunligi yaqin va harf uchliklari
+        # (trigram) bo'yicha eng o'xshash k ta boshqa javob. Teskari indeks orqali
+        # faqat umumiy trigrami bor javoblar solishtiriladi
+        normalized = [answer.strip().lower() for answer in answers]
+        scripts = [_script(answer) for answer in normalized]
+        grams = [_ngrams(answer) for answer in normalized]
+        postings = defaultdict(list)
+        for i, item_grams in enumerate(grams):
+            for gram in item_grams:
+                postings[gram].append(i)
+        # O'xshashi topilmaganlar uzunligi yaqin javoblar bilan to'ldiriladi
+        by_length = defaultdict(list)
+        for i in sorted(range(len(normalized)), key=lambda i: len(normalized[i])):
+            by_length[scripts[i]].append(i)
+        lengths = {script: [len(normalized[i]) for i in items] for script, items in by_length.items()}
+
+        candidates = array("i", [NO_CANDIDATE]) * (len(normalized) * k)
+        for i, answer in enumerate(normalized):
+            overlaps = defaultdict(int)
+            for gram in grams[i]:
+                posting = postings[gram]
+                if len(posting) <= MAX_POSTING:
+                    for j in posting:
+                        overlaps[j] += 1
+            scored = []
+            for j, overlap in overlaps.items():
+                if scripts[j] != scripts[i] or normalized[j] == answer:
+                    continue
+                dice = 2 * overlap / (len(grams[i]) + len(grams[j]))
+                length_ratio = min(len(answer), len(normalized[j])) / max(len(answer), len(normalized[j]), 1)
+                scored.append((0.7 * dice + 0.3 * length_ratio, -j, j))
+            chosen, seen = [], {answer}
+            for _, _, j in heapq.nlargest(4 * k, scored):
+                if normalized[j] not in seen:
+                    seen.add(normalized[j])
+                    chosen.append(j)
+                    if len(chosen) == k:
+                        break
+            if len(chosen) < k:
+                same_script, script_lengths = by_length[scripts[i]], lengths[scripts[i]]
+                position = bisect_left(script_lengths, len(answer))
+                left, right = position - 1, position
+                while len(chosen) < k and (left >= 0 or right < len(same_script)):
+                    take_right = left < 0 or (
+                        right < len(same_script)
+                        and script_lengths[right] - len(answer) <= len(answer) - script_lengths[left]
+                    )
+                    j = same_script[right] if take_right else same_script[left]
+                    if take_right:
+                        right += 1
+                    else:
+                        left -= 1
+                    if normalized[j] not in seen:
+                        seen.add(normalized[j])
+                        chosen.append(j)
+            candidates[i * k:i * k + len(chosen)] = array("i", chosen)
+        return cls(k, candidates)
+
+
+def _fingerprint(answers: list):
+    digest = hashlib.blake2b(digest_size=16)
+    for answer in answers:
+        digest.update(answer.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# Variantli test uchun noto'g'ri variantlar indeksi: har bir to'plam (lug'at darajasi,
+# grammatika bo'limi) uchun oldindan hisoblanadi, savol tuzish - O(1) qidiruv.
+# Kontent yangilanganda faqat javoblari o'zgargan to'plamlar qayta quriladi
+# (to'plam javoblari hash'i bo'yicha), qolganlari oldingi versiyadan olinadi.
+class DistractorIndex:
+    def __init__(self, k: int = 6, keep_versions: int = 8):
+        self.k = k
+        self.keep_versions = keep_versions
+        self._pools = {}  # fingerprint -> PoolDistractors
+        self._versions = OrderedDict()  # kontent versiyasi -> {pool_id: fingerprint}
+        self._tasks = set()
+
+    def lookup(self, version: str, pool_id: str, index: int):
+        fingerprint = self._versions.get(version, {}).get(pool_id)
+        pool = self._pools.get(fingerprint)
+        return pool.get(index) if pool is not None else None
+
+    def _compute(self, snapshot, known: set):
+        built, fingerprints = {}, {}
+        for pool_id, pool in snapshot.pools.items():
+            if pool_id == RANDOM_POOL_ID:
+                continue
+            answers = [str(answer) for _, answer in pool.items]
+            fingerprint = _fingerprint(answers)
+            fingerprints[pool_id] = fingerprint
+            if fingerprint not in known and fingerprint not in built:
+                built[fingerprint] = PoolDistractors.build(answers, self.k)
+        return fingerprints, built
+
+    def _apply(self, version: str, fingerprints: dict, built: dict):
+        self._pools.update(built)
+        self._versions[version] = fingerprints
+        while len(self._versions) > self.keep_versions:
+            self._versions.popitem(last=False)
+        used = {f for version_pools in self._versions.values() for f in version_pools.values()}
+        for fingerprint in [f for f in self._pools if f not in used]:
+            del self._pools[fingerprint]
+
+    async def _update(self, snapshot):
+        started = time.perf_counter()
+        fingerprints, built = await asyncio.to_thread(self._compute, snapshot, set(self._pools))
+        self._apply(snapshot.version, fingerprints, built)
+        logger.info(
+            f"Variantlar indeksi tayyor: {len(fingerprints)} ta to'plam, {len(built)} tasi qayta qurildi "
+            f"({(time.perf_counter() - started) * 1000:.0f} ms)"
+        )
+
+    def update(self, snapshot):
+        # ContentStore.on_reload listeneri: event loop ishlayotgan bo'lsa fonda quriladi
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._apply(snapshot.version, *self._compute(snapshot, set(self._pools)))
+            return
+        task = asyncio.create_task(self._update(snapshot))
+        self._tasks.add(task)
+        task.add_done_callback(self._update_done)
+
+    def _update_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Variantlar indeksini qurishda xato: {task.exception()}")
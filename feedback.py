@@ -0,0 +1,171 @@
+import asyncio
+import html
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from storage import load_json, save_to_json
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4000  # Telegram chegarasi 4096, sarlavha uchun joy qoldiramiz
+TEXT_PREVIEW = 1000  # digestda bitta fikrning ko'pi bilan shuncha belgisi ko'rsatiladi
+
+# Fikrlar qutisi: har bir fikr avval backendga (feedback.jsonl yoki SQLite) yoziladi,
+# foydalanuvchiga darhol javob beriladi, adminga esa fon ishchisi bir nechta fikrni
+# bitta digest xabarda yuboradi. Yetkazilgan oxirgi id checkpoint faylda saqlanadi,
+# shuning uchun yuborilmay qolgan fikrlar qayta ishga tushganda yana yuboriladi.
+class FeedbackInbox:
+    def __init__(self, bot, backend, admin_chat_id: int, checkpoint_file: str = 'feedback_delivery.json',
+                 batch_size: int = 10, batch_delay: float = 5.0, limit: int = 3, window: float = 600.0,
+                 max_backoff: float = 300.0):
+        self.bot = bot
+        self.backend = backend
+        self.admin_chat_id = admin_chat_id
+        self.checkpoint_file = checkpoint_file
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.limit = limit
+        self.window = window
+        self.max_backoff = max_backoff
+        self.delivered_upto = None
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self._recent = {}  # user_id -> deque(yuborilgan vaqtlar)
+        self._worker_task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def check_limit(self, user_id: int, now: float = None):
+        # Sirpanuvchi oyna: window sekundda ko'pi bilan limit ta fikr.
+        # Ruxsat bo'lsa 0, aks holda qancha sekund kutish kerakligini qaytaradi
+        now = time.monotonic() if now is None else now
+        recent = self._recent.get(user_id)
+        if recent is None:
+            if len(self._recent) >= 10000:
+                self._prune(now)
+            recent = self._recent[user_id] = deque()
+        while recent and recent[0] <= now - self.window:
+            recent.popleft()
+        if len(recent) >= self.limit:
+            return recent[0] + self.window - now
+        recent.append(now)
+        return 0
+
+    def _prune(self, now: float):
+        for user_id in [u for u, recent in self._recent.items() if not recent or recent[-1] <= now - self.window]:
+            del self._recent[user_id]
+
+    async def submit(self, user_id: int, username: str, text: str):
+        record = {
+            'user_id': user_id,
+            'username': username,
+            'text': text,
+            'created_at': datetime.now().isoformat()
+        }
+        record['id'] = await self.backend.add_feedback(record)
+        if self.admin_chat_id:
+            # Admin sozlanmagan bo'lsa fikr faqat backendda qoladi va admin
+            # sozlangandan keyingi ishga tushishda checkpoint orqali yuboriladi
+            self._pending.append(record)
+            self._wakeup.set()
+        return record['id']
+
+    async def _load(self):
+        checkpoint = await load_json(self.checkpoint_file, {}) or {}
+        self.delivered_upto = checkpoint.get('delivered_upto')
+        if self.delivered_upto is None:
+            # Checkpoint yo'q: avvalgi fikrlar adminga to'g'ridan-to'g'ri yuborilgan
+            self.delivered_upto = await self.backend.last_feedback_id()
+            await self._save_checkpoint()
+        if not self.admin_chat_id:
+            return
+        queued = {record['id'] for record in self._pending}
+        missed = [r for r in await self.backend.load_feedback(self.delivered_upto) if r['id'] not in queued]
+        self._pending[:0] = missed
+        if missed:
+            logger.info(f"Yetkazilmagan fikrlar navbatga qo'yildi: {len(missed)} ta")
+
+    async def _save_checkpoint(self):
+        await save_to_json(self.checkpoint_file, {'delivered_upto': self.delivered_upto})
+
+    def _digest(self, records: list):
+        header = f"<b>📬 Yangi fikrlar ({len(records)} ta):</b>\n\n"
+        parts = []
+        for record in records:
+            text = record['text']
+            if len(text) > TEXT_PREVIEW:
+                text = text[:TEXT_PREVIEW] + "…"
+            parts.append(
+                f"<b>#{record['id']}</b> @{html.escape(record.get('username') or 'Nomalum')} "
+                f"(ID: {record['user_id']}), {record['created_at'][:16].replace('T', ' ')}\n"
+                f"{html.escape(text)}"
+            )
+        return header + "\n\n".join(parts)
+
+    def _next_batch(self):
+        # Digest Telegram chegarasiga sig'adigan qilib olinadi (kamida bitta fikr)
+        batch = []
+        for record in self._pending[:self.batch_size]:
+            if batch and len(self._digest(batch + [record])) > MESSAGE_LIMIT:
+                break
+            batch.append(record)
+        return batch
+
+    async def _send(self, text: str):
+        # Faqat vaqtinchalik xatolar (tarmoq, Telegram 5xx, RetryAfter) qayta uriniladi.
+        # Boshqa xatoda (admin botni bloklagan, chat topilmadi) False qaytadi
+        attempt = 0
+        while True:
+            try:
+                await self.bot.send_message(self.admin_chat_id, text, parse_mode="HTML")
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                delay = min(self.max_backoff, 2 ** attempt)
+                logger.warning(f"Fikrlarni adminga yuborishda xato (urinish {attempt}), {delay} sekunddan so'ng qayta: {e}",
+                               extra={"rate_key": "feedback.delivery"})
+                await asyncio.sleep(delay)
+            except Exception as e:
+                logger.error(f"Fikrlarni adminga yuborib bo'lmadi, digest o'tkazib yuborildi: {e}",
+                             extra={"rate_key": "feedback.delivery"})
+                return False
+
+    async def _worker(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                # Bir nechta fikr bitta xabarga yig'ilishi uchun biroz kutamiz
+                await asyncio.sleep(self.batch_delay)
+            batch = self._next_batch()
+            sent = await self._send(self._digest(batch))
+            del self._pending[:len(batch)]
+            self.delivered_upto = max(self.delivered_upto or 0, batch[-1]['id'])
+            await self._save_checkpoint()
+            if sent:
+                logger.info(f"Adminga {len(batch)} ta fikr yuborildi")
+
+    async def start(self):
+        await self._load()
+        if not self.admin_chat_id:
+            logger.warning("ADMIN_ID sozlanmagan, fikrlar faqat saqlanadi")
+            return
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        # Yuborilmagan fikrlar backendda qoladi va keyingi ishga tushishda yuboriladi
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
@@ -0,0 +1,317 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+
+logger = logging.getLogger(__name__)
+
+def _key_to_str(key: StorageKey):
+    return ":".join((
+        str(key.bot_id), str(key.chat_id), str(key.user_id),
+        str(key.thread_id or ""), key.business_connection_id or "", key.destiny
+    ))
+
+def _dump(data: Dict[str, Any]):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")) if data else None
+
+def _load(raw: Optional[str]):
+    return json.loads(raw) if raw else {}
+
+# Bitta yozuvning taxminiy hajmi: kalit, dict va record obyektlari uchun qo'shimcha xarajat
+_RECORD_OVERHEAD = 400
+
+def _approx_size(state: Optional[str], data: Dict[str, Any]):
+    size = _RECORD_OVERHEAD + len(state or "")
+    if data:
+        size += len(json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str))
+    return size
+
+# MemoryStorage, lekin cheklangan: ttl sekunddan ko'p ishlatilmagan sessiyalar
+# o'chiriladi, umumiy hajm max_bytes dan oshsa eng uzoq ishlatilmaganlari (LRU)
+# chiqarib yuboriladi. Bo'sh sessiyalar xotirada umuman saqlanmaydi.
+class BoundedMemoryStorage(MemoryStorage):
+    def __init__(self, ttl: float = 24 * 3600, max_bytes: int = 64 * 1024 * 1024, cleanup_interval: float = 60):
+        super().__init__()
+        self.storage = {}
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.cleanup_interval = cleanup_interval
+        self._last_access = OrderedDict()
+        self._sizes = {}
+        self.total_bytes = 0
+        self.evicted_idle = 0
+        self.evicted_budget = 0
+        self._cleanup_task = None
+
+    def stats(self):
+        return {
+            'sessions': len(self.storage),
+            'approx_bytes': self.total_bytes,
+            'evicted_idle': self.evicted_idle,
+            'evicted_budget': self.evicted_budget
+        }
+
+    def _touch(self, key: StorageKey):
+        self._last_access[key] = time.monotonic()
+        self._last_access.move_to_end(key)
+
+    def _drop(self, key: StorageKey):
+        self.storage.pop(key, None)
+        self._last_access.pop(key, None)
+        self.total_bytes -= self._sizes.pop(key, 0)
+
+    def _store(self, key: StorageKey, record: MemoryStorageRecord):
+        if record.state is None and not record.data:
+            self._drop(key)
+            return
+        self.storage[key] = record
+        self._touch(key)
+        size = _approx_size(record.state, record.data)
+        self.total_bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        while self.total_bytes > self.max_bytes and len(self._last_access) > 1:
+            oldest = next(iter(self._last_access))
+            self._drop(oldest)
+            self.evicted_budget += 1
+
+    def _record(self, key: StorageKey):
+        record = self.storage.get(key)
+        if record is not None:
+            self._touch(key)
+        return record
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self.storage.get(key) or MemoryStorageRecord()
+        record.state = state.state if isinstance(state, State) else state
+        self._store(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._record(key)
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = self.storage.get(key) or MemoryStorageRecord()
+        record.data = data.copy()
+        self._store(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._record(key)
+        return record.data.copy() if record is not None else {}
+
+    def evict_idle(self):
+        deadline = time.monotonic() - self.ttl
+        removed = 0
+        while self._last_access:
+            key, last_access = next(iter(self._last_access.items()))
+            if last_access >= deadline:
+                break
+            self._drop(key)
+            removed += 1
+        self.evicted_idle += removed
+        return removed
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            removed = self.evict_idle()
+            if removed:
+                logger.info(f"Faol bo'lmagan FSM sessiyalari o'chirildi: {removed} ta, qoldi: {len(self.storage)} ta")
+
+    def start(self):
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+
+# Bitta foydalanuvchining (FSM kaliti bo'yicha) yangilanishlari ketma-ket, kelgan
+# tartibida ishlanadi, turli foydalanuvchilar esa parallel. Dispatcher holatni lock
+# olingandan keyin o'qiydi. Lock faqat kimdir ushlab turgan yoki kutayotgan paytda
+# saqlanadi, shuning uchun xotira bir vaqtda ishlanayotgan foydalanuvchilar soniga teng.
+# Faqat bitta jarayon ichida ishlaydi.
+class KeyedEventIsolation(BaseEventIsolation):
+    def __init__(self, on_wait=None):
+        self.on_wait = on_wait  # kutilgan vaqt (sekund) bilan chaqiriladi, faqat navbat bo'lganda
+        self._locks = {}  # key -> [asyncio.Lock, ushlab turgan va kutayotganlar soni]
+        self.acquired = 0
+        self.contended = 0
+        self.max_queue = 0
+
+    def stats(self):
+        return {
+            'keys': len(self._locks),
+            'acquired': self.acquired,
+            'contended': self.contended,
+            'max_queue': self.max_queue
+        }
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            lock = entry[0]
+            if entry[1] > 1:
+                self.contended += 1
+                self.max_queue = max(self.max_queue, entry[1] - 1)
+                started = time.perf_counter()
+                await lock.acquire()
+                if self.on_wait is not None:
+                    self.on_wait(time.perf_counter() - started)
+            else:
+                await lock.acquire()
+            self.acquired += 1
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def close(self) -> None:
+        pass
+
+# FSM holatlarini SQLite'da saqlaydi: bot qayta ishga tushsa ham quiz sessiyalari
+# yo'qolmaydi va bir nechta nusxa bitta bazadan foydalana oladi.
+# Ma'lumot ixcham JSON ko'rinishida yoziladi; ttl sekunddan ko'p ishlatilmagan
+# sessiyalar davriy ravishda o'chiriladi.
+class SqliteStorage(BaseStorage):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fsm (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_fsm_updated_at ON fsm(updated_at);
+    """
+    SELECT = "SELECT state, data, updated_at FROM fsm WHERE key = ?"
+    # ?4 - muddati o'tgan yozuvlar chegarasi: eskirgan sessiyaning qolgan qismi qayta tiklanmasligi kerak
+    UPSERT_STATE = """
+        INSERT INTO fsm (key, state, updated_at) VALUES (?1, ?2, ?3)
+        ON CONFLICT(key) DO UPDATE SET
+            state = ?2,
+            data = CASE WHEN fsm.updated_at < ?4 THEN NULL ELSE fsm.data END,
+            updated_at = ?3
+    """
+    UPSERT_DATA = """
+        INSERT INTO fsm (key, data, updated_at) VALUES (?1, ?2, ?3)
+        ON CONFLICT(key) DO UPDATE SET
+            data = ?2,
+            state = CASE WHEN fsm.updated_at < ?4 THEN NULL ELSE fsm.state END,
+            updated_at = ?3
+    """
+    DELETE_EXPIRED = "DELETE FROM fsm WHERE updated_at < ?"
+
+    def __init__(self, path: str = 'bot.db', ttl: float = 7 * 24 * 3600, cleanup_interval: float = 3600):
+        self.path = path
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._conn = None
+        self._cleanup_task = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def _select(self, key: str):
+        row = self._connect().execute(self.SELECT, (key,)).fetchone()
+        if row is None or row[2] < time.time() - self.ttl:
+            return None, {}
+        return row[0], _load(row[1])
+
+    def _write(self, sql: str, key: str, value):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(sql, (key, value, now, now - self.ttl))
+
+    def _update_data(self, key: str, data: Dict[str, Any]):
+        # O'qish va yozish bitta thread'da ketma-ket bajariladi, shuning uchun
+        # update_data bitta so'rov navbatida atomar bo'ladi
+        _, current = self._select(key)
+        current.update(data)
+        self._write(self.UPSERT_DATA, key, _dump(current))
+        return current
+
+    def _delete_expired(self):
+        conn = self._connect()
+        with conn:
+            return conn.execute(self.DELETE_EXPIRED, (time.time() - self.ttl,)).rowcount
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._run(self._write, self.UPSERT_STATE, _key_to_str(key), state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._run(self._select, _key_to_str(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._run(self._write, self.UPSERT_DATA, _key_to_str(key), _dump(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._run(self._select, _key_to_str(key))
+        return data
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        current = await self._run(self._update_data, _key_to_str(key), data)
+        return current.copy()
+
+    async def evict_expired(self):
+        removed = await self._run(self._delete_expired)
+        if removed:
+            logger.info(f"Eskirgan FSM sessiyalari o'chirildi: {removed} ta")
+        return removed
+
+    async def _cleanup_loop(self):
+        while True:
+            try:
+                await self.evict_expired()
+            except Exception as e:
+                logger.error(f"FSM sessiyalarini tozalashda xato: {e}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    def start(self):
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
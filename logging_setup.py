@@ -0,0 +1,78 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Ko'p takrorlanadigan (har bir foydalanuvchi yoki yangilanish uchun) log qatorlarini
+# cheklaydi: har bir kalit uchun token bucket, `burst` tagacha portlash va o'rtacha
+# `rate` qator/sekund. Kalit - extra={"rate_key": ...} yoki `loggers` dagi logger nomi.
+# Tashlab yuborilganlar soni keyingi o'tkazilgan qatorga qo'shib yoziladi.
+class RateLimitFilter(logging.Filter):
+    def __init__(self, rate: float = 1.0, burst: int = 20, loggers=()):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.loggers = set(loggers)
+        self._buckets = {}  # kalit -> [tokenlar, oxirgi vaqt, tashlab yuborilganlar]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord):
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            if record.name not in self.loggers or record.levelno >= logging.WARNING:
+                return True
+            key = record.name
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.getMessage()} (+{dropped} ta o'xshash qator o'tkazib yuborildi)"
+            record.args = None
+        return True
+
+
+# Loglar event loop thread'ida faqat navbatga qo'yiladi; faylga va konsolga yozish,
+# fayl rotatsiyasi alohida QueueListener thread'ida bajariladi
+def setup_logging(filename: str = "bot.log", level=logging.INFO, max_bytes: int = 5 * 1024 * 1024,
+                  backup_count: int = 5, rotate_when: str = None, rate: float = 1.0, burst: int = 20,
+                  rate_limited_loggers=("aiogram.event",)):
+    formatter = logging.Formatter(LOG_FORMAT)
+    if rotate_when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            filename, when=rotate_when, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate, burst, rate_limited_loggers))
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Jarayon tugashida navbatdagi qatorlar yozib bo'linadi
+    atexit.register(listener.stop)
+    return listener
@@ -1,27 +1,47 @@
-import json
+import contextlib
+import csv
+import hmac
+import html
 import os
 import random
 import asyncio
 import logging
-from datetime import datetime
-from aiogram import Bot, Dispatcher, types
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-from aiogram.fsm.storage.memory import MemoryStorage
+import tempfile
+from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from aiogram import Bot, Dispatcher, F, types
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.filters import CommandStart, Command
-from aiogram.exceptions import TelegramNetworkError
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
-from aiohttp import web
-
-# Logging sozlamalari
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("bot.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError
+
+from broadcast import Broadcast
+from content import RANDOM_POOL_ID, ContentError, ContentStore, dictionary_pool_id, grammar_pool_id, parse_pool_id
+from distractors import DistractorIndex
+from feedback import FeedbackInbox
+from fsm_storage import BoundedMemoryStorage, KeyedEventIsolation, SqliteStorage
+from matching import answer_distance
+from metrics import Metrics
+from registry import UserRegistry
+from review import DEFAULT_INTERVALS, ReviewScheduler, review_item, split_review_item
+from search import SearchIndex
+from stats import Stats
+from storage import create_backend
+from timers import TimerScheduler
+from logging_setup import setup_logging
+
+# Logging sozlamalari: yozish alohida thread'da, fayl hajm (yoki vaqt) bo'yicha aylanadi
+setup_logging(
+    os.getenv("LOG_FILE", "bot.log"),
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    max_bytes=int(float(os.getenv("LOG_MAX_MB", 5)) * 1024 * 1024),
+    backup_count=int(os.getenv("LOG_BACKUP_COUNT", 5)),
+    rotate_when=os.getenv("LOG_ROTATE_WHEN") or None,  # masalan "midnight"; bo'sh - hajm bo'yicha
+    rate=float(os.getenv("LOG_RATE", 1)),  # har bir foydalanuvchi uchun yoziladigan qatorlar, qator/sekund
+    burst=int(os.getenv("LOG_BURST", 20))
 )
 logger = logging.getLogger(__name__)
 
@@ -30,48 +50,40 @@ TOKEN = os.getenv("BOT_TOKEN")
 WEBHOOK_PATH = "/webhook"
 WEBAPP_HOST = "0.0.0.0"
 WEBAPP_PORT = int(os.getenv("PORT", 8080))
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")  # memory yoki sqlite
+FSM_SESSION_TTL = float(os.getenv("FSM_SESSION_TTL", 7 * 24 * 3600))  # sekund
+FSM_MEMORY_BUDGET_MB = float(os.getenv("FSM_MEMORY_BUDGET_MB", 64))  # faqat memory uchun
 bot = Bot(token=TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+if FSM_STORAGE == "sqlite":
+    fsm_storage = SqliteStorage(os.getenv("DATABASE_PATH", "bot.db"), ttl=FSM_SESSION_TTL)
+else:
+    fsm_storage = BoundedMemoryStorage(ttl=FSM_SESSION_TTL, max_bytes=int(FSM_MEMORY_BUDGET_MB * 1024 * 1024))
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", 300))  # polling rejimida xulosa necha sekundda bir
+# /metrics uchun token ("Authorization: Bearer <token>" yoki ?token=); bo'sh bo'lsa /metrics ochilmaydi
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+metrics = Metrics()
+# Bitta foydalanuvchining yangilanishlari va quiz taymerlari ketma-ket ishlanadi
+update_isolation = KeyedEventIsolation(on_wait=metrics.lock_wait.observe)
+dp = Dispatcher(storage=fsm_storage, events_isolation=update_isolation)
+dp.message.middleware(metrics.handler_middleware)
+dp.callback_query.middleware(metrics.handler_middleware)
+bot.session.middleware(metrics.observe_request)
 
 # Ma'lumotlarni yuklash
-def load_data():
-    data = {"Dictionary": {}, "Grammar": {}}
-    dict_names = []
-    grammar_names = []
-    
-    try:
-        with open('dictionary.json', 'r', encoding='utf-8') as f:
-            dictionary_data = json.load(f)
-            dict_names = list(dictionary_data.keys())
-            for dict_name in dict_names:
-                data["Dictionary"][dict_name] = dictionary_data[dict_name]
-    except FileNotFoundError:
-        logger.error("dictionary.json fayli topilmadi")
-        return None, [], []
-    except json.JSONDecodeError as e:
-        logger.error(f"dictionary.json faylini dekodlashda xato: {e}")
-        return None, [], []
-    
-    try:
-        with open('grammar.json', 'r', encoding='utf-8') as f:
-            grammar_data = json.load(f)
-            grammar_names = list(grammar_data.keys())
-            for grammar_name in grammar_names:
-                data["Grammar"][grammar_name] = grammar_data[grammar_name]
-    except FileNotFoundError:
-        logger.warning("grammar.json fayli topilmadi, bo'sh Grammar ma'lumotlari ishlatiladi")
-        data["Grammar"] = {}
-    except json.JSONDecodeError as e:
-        logger.error(f"grammar.json faylini dekodlashda xato: {e}")
-        data["Grammar"] = {}
-    
-    logger.info(f"Yuklangan lug'atlar: {len(dict_names)}, grammatika bo'limlari: {len(grammar_names)}")
-    return data, dict_names, grammar_names
+CONTENT_WATCH_INTERVAL = float(os.getenv("CONTENT_WATCH_INTERVAL", 30))  # 0 - kuzatilmaydi
+CONTENT_INDEX = os.getenv("CONTENT_INDEX")  # indeks fayli; JSON manbalar yangiroq bo'lsa avtomatik qayta quriladi
+CONTENT_WAIT_TIMEOUT = float(os.getenv("CONTENT_WAIT_TIMEOUT", 20))  # sekund
+content_store = ContentStore('dictionary.json', 'grammar.json', watch_interval=CONTENT_WATCH_INTERVAL,
+                             index_file=CONTENT_INDEX or None)
+
+@content_store.on_reload
+def apply_content(snapshot):
+    global DATA, DICT_NAMES, GRAMMAR_NAMES, QUESTION_POOLS
+    DATA, DICT_NAMES, GRAMMAR_NAMES = snapshot.data, snapshot.dict_names, snapshot.grammar_names
+    QUESTION_POOLS = snapshot.pools
 
-DATA, DICT_NAMES, GRAMMAR_NAMES = load_data()
-if DATA is None:
-    logger.critical("Ma'lumot fayllari yuklanmadi!")
-    raise Exception("Ma'lumot fayllari yuklanmadi!")
+# Ma'lumotlar bot ishga tushgandan keyin fonda yuklanadi (content_store.start)
+DATA, DICT_NAMES, GRAMMAR_NAMES, QUESTION_POOLS = {"Dictionary": {}, "Grammar": {}}, [], [], {}
 
 # Konstantalar
 LEVEL_MAPPING = {
@@ -85,8 +97,56 @@ LEVEL_EMOJIS = {
     "Hard": "🔥"
 }
 ITEMS_PER_PAGE = 10
+ANSWER_MAX_TYPOS = int(os.getenv("ANSWER_MAX_TYPOS", 0))  # 5+ harfli javoblarda nechta harf xatosi kechiriladi, 0 - o'chiq
 TIME_LIMIT = int(os.getenv("TIME_LIMIT", 30))  # Default to 30 if not set
+# Taymer xabari qaysi sekundlarda yangilanadi, masalan "15,5"; "off" - taymer xabari ko'rsatilmaydi
+COUNTDOWN_MARKS = os.getenv("COUNTDOWN_MARKS", "15,5")
+COUNTDOWN_MARKS = None if COUNTDOWN_MARKS.strip().lower() == "off" else tuple(
+    int(m) for m in COUNTDOWN_MARKS.split(",") if m.strip()
+)
 ADMIN_ID = int(os.getenv("ADMIN_ID", 0))  # Set your admin ID in Render environment variables
+USERS_FLUSH_INTERVAL = float(os.getenv("USERS_FLUSH_INTERVAL", 5))  # users.json necha sekundda bir yoziladi
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")  # json yoki sqlite
+DATABASE_PATH = os.getenv("DATABASE_PATH", "bot.db")
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", 20))  # admin ro'yxatida bir sahifadagi foydalanuvchilar
+USERS_FILTER_DAYS = (0, 1, 7, 30)  # "oxirgi N kunda faol" filtrlari, 0 - hammasi
+# Leitner qutilari oralig'i (kunlarda) va bitta takrorlash quizidagi savollar soni
+REVIEW_INTERVALS = tuple(
+    float(d) for d in os.getenv("REVIEW_INTERVALS", ",".join(map(str, DEFAULT_INTERVALS))).split(",") if d.strip()
+)
+REVIEW_BATCH = int(os.getenv("REVIEW_BATCH", 20))
+# Savollarni foydalanuvchi xatolari va yaqinda ko'rilganiga qarab tanlash; "off" - oddiy tasodifiy
+ADAPTIVE_SAMPLING = os.getenv("ADAPTIVE_SAMPLING", "on").strip().lower() != "off"
+RECENT_WINDOW_HOURS = float(os.getenv("RECENT_WINDOW_HOURS", 6))  # shu vaqt ichida ko'rilgan savollar kamroq chiqadi
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", 60))  # stats.json necha sekundda bir yoziladi
+FEEDBACK_BATCH_DELAY = float(os.getenv("FEEDBACK_BATCH_DELAY", 5))  # adminga digest yuborishdan oldin kutish, sekund
+FEEDBACK_LIMIT = int(os.getenv("FEEDBACK_LIMIT", 3))  # bitta foydalanuvchidan FEEDBACK_WINDOW_MINUTES ichida
+FEEDBACK_WINDOW_MINUTES = float(os.getenv("FEEDBACK_WINDOW_MINUTES", 10))
+
+storage_backend = create_backend(STORAGE_BACKEND, DATABASE_PATH, 'users.json')
+users_registry = UserRegistry(storage_backend, flush_interval=USERS_FLUSH_INTERVAL)
+quiz_timers = TimerScheduler()
+metrics.gauge("bot_active_quizzes", "Javob kutilayotgan savollar (faol taymerlar)", lambda: len(quiz_timers))
+metrics.gauge("bot_timer_callbacks", "Bajarilayotgan taymer callback'lari", lambda: quiz_timers.pending_callbacks)
+metrics.gauge("bot_update_locks", "Ishlanayotgan yoki navbatda turgan foydalanuvchilar", lambda: update_isolation.stats()['keys'])
+metrics.gauge("bot_update_lock_contended", "Oldingi yangilanishni kutgan yangilanishlar (jami)",
+              lambda: update_isolation.contended)
+if isinstance(fsm_storage, BoundedMemoryStorage):
+    metrics.gauge("bot_fsm_sessions", "Xotiradagi FSM sessiyalari", lambda: fsm_storage.stats()['sessions'])
+review_scheduler = ReviewScheduler(storage_backend, REVIEW_INTERVALS, flush_interval=USERS_FLUSH_INTERVAL,
+                                   recent_window=RECENT_WINDOW_HOURS * 3600)
+stats = Stats('stats.json', flush_interval=STATS_FLUSH_INTERVAL)
+feedback_inbox = FeedbackInbox(bot, storage_backend, ADMIN_ID, batch_delay=FEEDBACK_BATCH_DELAY,
+                               limit=FEEDBACK_LIMIT, window=FEEDBACK_WINDOW_MINUTES * 60)
+metrics.gauge("bot_feedback_pending", "Adminga yuborilmagan fikrlar", lambda: len(feedback_inbox))
+
+BROADCAST_OPTIONS = {
+    'checkpoint_file': 'broadcast.json',
+    'workers': int(os.getenv("BROADCAST_WORKERS", 8)),
+    'rate': float(os.getenv("BROADCAST_RATE", 25)),  # xabar/sekund, Telegram chegarasi ~30
+    'progress_interval': float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 10)),
+}
+broadcast_task = None
 
 # Holatlar
 class QuizStates(StatesGroup):
@@ -98,6 +158,7 @@ class QuizStates(StatesGroup):
     asking_question = State()
     confirming_end = State()
     random_questions = State()
+    choosing_answer = State()
 
 class LearningStates(StatesGroup):
     learning_menu = State()
@@ -112,7 +173,19 @@ class AdminStates(StatesGroup):
 class FeedbackStates(StatesGroup):
     waiting_for_feedback = State()
 
+class QuizAnswer(CallbackData, prefix="qa"):
+    q: int  # savol tartib raqami: eski xabardagi tugmalar e'tiborsiz qoldiriladi
+    o: int  # variant indeksi, -1 - quizni tugatish
+
+class UsersPage(CallbackData, prefix="users"):
+    action: str  # page yoki csv
+    page: int = 0
+    days: int = 0
+
 # Dinamik klaviaturalar
+# Klaviaturalar soni kam va har sahifa uchun o'zgarmas, shuning uchun ular keshlanadi.
+# Ma'lumotlar qayta yuklanganda clear_keyboard_cache() chaqirilishi kerak.
+@lru_cache(maxsize=None)
 def get_main_menu(is_admin=False, has_wrong_answers=False):
     keyboard = [
         [KeyboardButton(text="🚀 Quiz boshlash"), KeyboardButton(text="📚 O‘quv rejimi")],
@@ -124,6 +197,7 @@ def get_main_menu(is_admin=False, has_wrong_answers=False):
         keyboard.append([KeyboardButton(text="🛠 Admin paneli")])
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True, one_time_keyboard=True)
 
+@lru_cache(maxsize=64)
 def get_dict_menu(page=0, per_page=6):
     keyboard = []
     start = page * per_page
@@ -147,6 +221,7 @@ def get_dict_menu(page=0, per_page=6):
     
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True, one_time_keyboard=True)
 
+@lru_cache(maxsize=64)
 def get_grammar_menu(page=0, per_page=6):
     keyboard = []
     start = page * per_page
@@ -170,6 +245,7 @@ def get_grammar_menu(page=0, per_page=6):
     
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True, one_time_keyboard=True)
 
+@lru_cache(maxsize=256)
 def get_learning_navigation(page, total_pages):
     keyboard = []
     nav_row = []
@@ -182,6 +258,32 @@ def get_learning_navigation(page, total_pages):
     keyboard.append([KeyboardButton(text="↩️ Orqaga")])
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True, one_time_keyboard=True)
 
+def clear_keyboard_cache():
+    for builder in (get_main_menu, get_dict_menu, get_grammar_menu, get_learning_navigation):
+        builder.cache_clear()
+
+def warm_keyboard_cache(per_page=6):
+    for is_admin in (False, True):
+        for has_wrong_answers in (False, True):
+            get_main_menu(is_admin, has_wrong_answers)
+    for page in range(max(1, -(-len(DICT_NAMES) // per_page))):
+        get_dict_menu(page)
+    for page in range(max(1, -(-len(GRAMMAR_NAMES) // per_page))):
+        get_grammar_menu(page)
+
+@content_store.on_reload
+def refresh_keyboards(snapshot):
+    clear_keyboard_cache()
+    warm_keyboard_cache()
+
+# Variantli test uchun o'xshash javoblar har bir kontent versiyasi uchun fonda hisoblanadi
+DISTRACTOR_CANDIDATES = int(os.getenv("DISTRACTOR_CANDIDATES", 6))  # har bir savol uchun saqlanadigan nomzodlar
+distractor_index = DistractorIndex(DISTRACTOR_CANDIDATES)
+content_store.on_reload(distractor_index.update)
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", 10))  # /search javobidagi natijalar soni
+search_index = SearchIndex()
+content_store.on_reload(search_index.update)
+
 REPEAT_WRONG_MARKUP = ReplyKeyboardMarkup(
     keyboard=[[KeyboardButton(text="🔄 Xatolarni tuzatish")]],
     resize_keyboard=True, one_time_keyboard=True
@@ -190,7 +292,8 @@ REPEAT_WRONG_MARKUP = ReplyKeyboardMarkup(
 QUIZ_MENU = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="📖 Lug‘atlar"), KeyboardButton(text="📚 Grammatika")],
-        [KeyboardButton(text="🎲 Tasodifiy savollar"), KeyboardButton(text="↩️ Bosh menyuga")]
+        [KeyboardButton(text="🎲 Tasodifiy savollar"), KeyboardButton(text="🧠 Takrorlash")],
+        [KeyboardButton(text="🔘 Variantli test"), KeyboardButton(text="↩️ Bosh menyuga")]
     ], resize_keyboard=True, one_time_keyboard=True
 )
 
@@ -218,10 +321,15 @@ COUNT_MARKUP = ReplyKeyboardMarkup(
 ADMIN_MARKUP = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="👤 Foydalanuvchilar ro‘yxati"), KeyboardButton(text="📩 Xabar yuborish")],
-        [KeyboardButton(text="↩️ Bosh menyuga")]
+        [KeyboardButton(text="📊 Statistika"), KeyboardButton(text="↩️ Bosh menyuga")]
     ], resize_keyboard=True, one_time_keyboard=True
 )
 
+BACK_MARKUP = ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="↩️ Orqaga")]],
+    resize_keyboard=True, one_time_keyboard=True
+)
+
 CONFIRM_END_MARKUP = ReplyKeyboardMarkup(
     keyboard=[[KeyboardButton(text="✔️ Ha, tugatish"), KeyboardButton(text="✖️ Yo‘q, davom etish")]],
     resize_keyboard=True, one_time_keyboard=True
@@ -229,70 +337,100 @@ CONFIRM_END_MARKUP = ReplyKeyboardMarkup(
 
 # Foydalanuvchilarni saqlash
 async def save_user(user_id: int, username: str):
-    users = await load_json('users.json', [])
-    user = next((u for u in users if u['id'] == user_id), None)
-    current_time = datetime.now().isoformat()
-    
-    if user:
-        user['username'] = username or user.get('username', 'Nomalum')
-        user['last_active'] = current_time
-        logger.info(f"Foydalanuvchi yangilandi: ID={user_id}, Username=@{username or 'Nomalum'}, Oxirgi faol: {current_time}")
+    stats.user_active(user_id)
+    if users_registry.touch(user_id, username):
+        logger.info(f"Yangi foydalanuvchi saqlandi: ID={user_id}, Username=@{username or 'Nomalum'}",
+                    extra={"rate_key": "users.new"})
     else:
-        new_user = {
-            'id': user_id,
-            'username': username or 'Nomalum',
-            'last_active': current_time
-        }
-        users.append(new_user)
-        logger.info(f"Yangi foydalanuvchi saqlandi: ID={user_id}, Username=@{username or 'Nomalum'}, Oxirgi faol: {current_time}")
-    
-    await save_to_json('users.json', users)
+        logger.debug(f"Foydalanuvchi yangilandi: ID={user_id}, Username=@{username or 'Nomalum'}")
 
-# Fayl bilan ishlash
-async def save_to_json(filename: str, data: list):
-    try:
-        async with asyncio.Lock():
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.debug(f"{filename} fayliga ma'lumot saqlandi")
-    except Exception as e:
-        logger.error(f"{filename} saqlashda xato: {e}")
+# Taymer
+async def start_question_timer(message: types.Message, state: FSMContext):
+    countdown = None
+    if COUNTDOWN_MARKS is not None:
+        countdown = await message.answer(f"⏳ {TIME_LIMIT} sekund qoldi", parse_mode="HTML")
+    timer = quiz_timers.schedule(
+        state.key, TIME_LIMIT, COUNTDOWN_MARKS or (),
+        on_tick=countdown_tick if countdown else None,
+        on_expire=partial(question_timeout, message, state)
+    )
+    timer.countdown = countdown
 
-async def load_json(filename: str, default=None):
-    try:
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        logger.warning(f"{filename} fayli topilmadi, default qiymat ishlatiladi")
-        return default or []
-    except Exception as e:
-        logger.error(f"{filename} yuklashda xato: {e}")
-        return default or []
+async def countdown_tick(timer, remaining: int):
+    if timer.cancelled:
+        return
+    emoji = "⏳" if remaining > TIME_LIMIT // 2 else "⏲" if remaining > 5 else "⏰"
+    # Javob kelib, cancel_timer xabarni o'chirgan bo'lishi mumkin
+    with contextlib.suppress(TelegramBadRequest):
+        await timer.countdown.edit_text(f"{emoji} {remaining} sekund qoldi", parse_mode="HTML")
 
-# Taymer
-async def question_timer(message: types.Message, state: FSMContext):
-    countdown = await message.answer(f"⏳ {TIME_LIMIT} sekund qoldi", parse_mode="HTML")
-    try:
-        for remaining in range(TIME_LIMIT - 1, -1, -1):
-            await asyncio.sleep(1)
-            if (await state.get_data()).get('answered', False):
-                await countdown.delete()
-                return
-            emoji = "⏳" if remaining > TIME_LIMIT // 2 else "⏲" if remaining > 5 else "⏰"
-            await countdown.edit_text(f"{emoji} {remaining} sekund qoldi", parse_mode="HTML")
-        await countdown.edit_text("⏰ Vaqt tugadi! ⏰")
+# Taymer foydalanuvchi yangilanishlari bilan bitta navbatda ishlaydi. Muddat tugagan
+# paytda javob ishlanayotgan bo'lsa, javob yangi savol (yangi taymer) yoki quiz
+# yakuniga olib keladi va eski taymer hech narsa qilmaydi
+async def timer_expired(state: FSMContext, quiz_state: State):
+    return quiz_timers.get(state.key) is None and await state.get_state() == quiz_state.state
+
+async def question_timeout(message: types.Message, state: FSMContext, timer):
+    async with update_isolation.lock(state.key):
+        if not await timer_expired(state, QuizStates.asking_question):
+            if timer.countdown is not None:
+                with contextlib.suppress(TelegramBadRequest):
+                    await timer.countdown.delete()
+            return
+        if timer.countdown is not None:
+            await timer.countdown.edit_text("⏰ Vaqt tugadi! ⏰")
+        else:
+            await message.answer("⏰ Vaqt tugadi! ⏰")
         await end_test(message, state)
-    except asyncio.CancelledError:
-        await countdown.delete()
 
 async def cancel_timer(state: FSMContext):
-    timer_task = (await state.get_data()).get('timer_task')
-    if timer_task and not timer_task.done():
-        timer_task.cancel()
-        try:
-            await timer_task
-        except asyncio.CancelledError:
-            pass
+    timer = quiz_timers.cancel(state.key)
+    if timer is not None and timer.countdown is not None:
+        with contextlib.suppress(TelegramBadRequest):
+            await timer.countdown.delete()
+
+# Kontent versiyasi: quiz yoki o'quv rejimi boshlangan versiya bilan davom etadi,
+# fayllar yangilansa ham savol indekslari boshqa savollarga o'tib ketmaydi
+def get_pool(user_data: dict):
+    return content_store.pool(user_data.get('pool_id'), user_data.get('content_version'))
+
+async def pick_questions(user_id: int, user_data: dict, pool, count: int):
+    if not ADAPTIVE_SAMPLING:
+        return random.sample(range(len(pool)), count)
+    snapshot = content_store.snapshot(user_data.get('content_version'))
+    return await review_scheduler.sample(user_id, snapshot, user_data['pool_id'], count)
+
+async def content_changed(message: types.Message, state: FSMContext):
+    await cancel_timer(state)
+    await state.clear()
+    await message.answer(
+        "<b>🔄 Savollar yangilandi!</b>\nIltimos, bo‘limni qaytadan tanlang.",
+        parse_mode="HTML",
+        reply_markup=get_main_menu(message.chat.id == ADMIN_ID)
+    )
+
+# Ma'lumotlar hali yuklanayotgan bo'lsa, /start va kontentga bog'liq bo'lmagan
+# tugmalar darhol javob beradi, qolgan xabarlar yuklanish tugashini kutadi
+CONTENT_FREE_TEXTS = {"ℹ️ Bot haqida", "📬 Fikr yuborish"}
+
+@dp.message.outer_middleware()
+async def wait_for_content(handler, message: types.Message, data: dict):
+    text = message.text or ""
+    if content_store.current is None and not text.startswith("/start") and text not in CONTENT_FREE_TEXTS:
+        if not await content_store.wait_ready(CONTENT_WAIT_TIMEOUT):
+            await message.answer("<b>⏳ Bot ishga tushmoqda...</b>\nBirozdan so‘ng qayta urinib ko‘ring.", parse_mode="HTML")
+            return
+    return await handler(message, data)
+
+# Ommaviy xabar
+def run_broadcast(broadcast: Broadcast):
+    global broadcast_task
+    broadcast_task = asyncio.create_task(broadcast.run())
+    broadcast_task.add_done_callback(_broadcast_done)
+
+def _broadcast_done(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Xabar yuborishda xato: {task.exception()}")
 
 # Handlerlar
 @dp.message(CommandStart())
@@ -326,11 +464,7 @@ async def feedback_start(message: types.Message, state: FSMContext):
     await save_user(message.from_user.id, message.from_user.username)
     await message.answer(
         "<b>✍️ Fikringizni yozing, adminlarimiz ko‘rib chiqadi:</b>",
-        reply_markup=ReplyKeyboardMarkup(
-            keyboard=[[KeyboardButton(text="↩️ Orqaga")]],
-            resize_keyboard=True,
-            one_time_keyboard=True
-        ),
+        reply_markup=BACK_MARKUP,
         parse_mode="HTML"
     )
     await state.set_state(FeedbackStates.waiting_for_feedback)
@@ -345,27 +479,33 @@ async def save_feedback(message: types.Message, state: FSMContext):
     feedback_text = message.text
     user_id = message.from_user.id
     username = message.from_user.username or "Nomalum"
-    
-    try:
-        await bot.send_message(
-            ADMIN_ID,
-            f"<b>📬 Yangi fikr:</b>\n"
-            f"<b>Foydalanuvchi:</b> @{username} (ID: {user_id})\n"
-            f"<b>Xabar:</b> {feedback_text}",
+
+    wait = feedback_inbox.check_limit(user_id)
+    if wait:
+        await message.answer(
+            f"<b>⏳ Siz juda ko‘p fikr yubordingiz!</b>\n{int(wait // 60) + 1} daqiqadan so‘ng qayta urinib ko‘ring.",
+            reply_markup=get_main_menu(user_id == ADMIN_ID),
             parse_mode="HTML"
         )
+        await state.clear()
+        return
+
+    # Fikr saqlangach foydalanuvchiga darhol javob beriladi, adminga fon ishchisi yuboradi
+    try:
+        await feedback_inbox.submit(user_id, username, feedback_text)
         await message.answer(
             "<b>✅ Fikringiz yuborildi, rahmat!</b>",
             reply_markup=get_main_menu(user_id == ADMIN_ID),
             parse_mode="HTML"
         )
-        logger.info(f"Fikr yuborildi: ID={user_id}, Username=@{username}, Xabar={feedback_text}")
+        logger.info(f"Fikr saqlandi: ID={user_id}, Username=@{username}, {len(feedback_text)} belgi",
+                    extra={"rate_key": "feedback"})
     except Exception as e:
         await message.answer(
             "<b>❌ Fikr yuborishda xato yuz berdi, qaytadan urinib ko‘ring!</b>",
             parse_mode="HTML"
         )
-        logger.error(f"Fikr yuborishda xato: ID={user_id}, Xato={e}")
+        logger.error(f"Fikrni saqlashda xato: ID={user_id}, Xato={e}")
     
     await state.clear()
 
@@ -379,23 +519,206 @@ async def admin_panel(message: types.Message, state: FSMContext):
     )
     await state.clear()
 
-@dp.message(lambda msg: msg.text == "👤 Foydalanuvchilar ro‘yxati" and msg.from_user.id == ADMIN_ID)
-async def show_users(message: types.Message):
-    users = await load_json('users.json', [])
+# Foydalanuvchilar ro'yxati: har safar faqat so'ralgan sahifa backenddan o'qiladi (id bo'yicha
+# keyset). Sahifalar boshlanadigan id'lar admin FSM ma'lumotida saqlanadi
+def users_filter_since(days: int):
+    return (datetime.now() - timedelta(days=days)).isoformat() if days else None
+
+def users_filter_label(days: int):
+    return f"{days} kun" if days else "Hammasi"
+
+def get_users_keyboard(page: int, days: int, has_next: bool):
+    nav_row = []
+    if page > 0:
+        nav_row.append(InlineKeyboardButton(text="⬅️ Oldingi", callback_data=UsersPage(action="page", page=page - 1, days=days).pack()))
+    if has_next:
+        nav_row.append(InlineKeyboardButton(text="➡️ Keyingi", callback_data=UsersPage(action="page", page=page + 1, days=days).pack()))
+    filter_row = [
+        InlineKeyboardButton(
+            text=f"{'✅ ' if d == days else ''}{users_filter_label(d)}",
+            callback_data=UsersPage(action="page", days=d).pack()
+        ) for d in USERS_FILTER_DAYS
+    ]
+    download_row = [InlineKeyboardButton(text="📥 CSV yuklab olish", callback_data=UsersPage(action="csv", days=days).pack())]
+    return InlineKeyboardMarkup(inline_keyboard=[row for row in (nav_row, filter_row, download_row) if row])
+
+async def render_users_page(state: FSMContext, page: int, days: int):
+    user_data = await state.get_data()
+    cursors = user_data.get('users_cursors') if user_data.get('users_days') == days else None
+    cursors = cursors or [None]
+    page = max(0, min(page, len(cursors) - 1))
+    active_since = users_filter_since(days)
+
+    users = []
+    async with contextlib.aclosing(users_registry.iter_users(active_since, cursors[page], USERS_PAGE_SIZE + 1)) as rows:
+        async for user in rows:
+            users.append(user)
+            if len(users) > USERS_PAGE_SIZE:
+                break
+    has_next = len(users) > USERS_PAGE_SIZE
+    users = users[:USERS_PAGE_SIZE]
+    cursors = cursors[:page + 1] + ([users[-1]['id']] if has_next else [])
+    await state.update_data(users_cursors=cursors, users_days=days)
+
+    total = await users_registry.count(active_since)
+    header = f"<b>👥 Foydalanuvchilar soni: {total}</b> ({users_filter_label(days)}, {page + 1}-sahifa)"
     if not users:
-        await message.answer("<b>👤 Hozircha foydalanuvchilar yo‘q!</b>", reply_markup=ADMIN_MARKUP, parse_mode="HTML")
-        return
-    
+        return f"{header}\n\nBu davrda faol foydalanuvchilar yo‘q.", get_users_keyboard(0, days, False)
     user_list = "\n".join(
-        f"👤 ID: {u['id']} | @{u['username']} | Oxirgi faol: {u.get('last_active', 'Nomalum')}"
+        f"👤 ID: {u['id']} | @{html.escape(str(u['username']))} | Oxirgi faol: {u.get('last_active') or 'Nomalum'}"
         for u in users
     )
+    return f"{header}\n\n{user_list}", get_users_keyboard(page, days, has_next)
+
+async def write_users_csv(path: str, active_since: str = None):
+    # Foydalanuvchilar paketlab o'qiladi va faylga yoziladi, ro'yxat xotirada to'planmaydi
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "username", "last_active"])
+        batch = []
+        async for user in users_registry.iter_users(active_since):
+            batch.append((user['id'], user['username'], user.get('last_active') or ""))
+            if len(batch) >= 500:
+                await asyncio.to_thread(writer.writerows, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            await asyncio.to_thread(writer.writerows, batch)
+            count += len(batch)
+    return count
+
+@dp.message(lambda msg: msg.text == "👤 Foydalanuvchilar ro‘yxati" and msg.from_user.id == ADMIN_ID)
+async def show_users(message: types.Message, state: FSMContext):
+    if not await users_registry.count():
+        await message.answer("<b>👤 Hozircha foydalanuvchilar yo‘q!</b>", reply_markup=ADMIN_MARKUP, parse_mode="HTML")
+        return
+    text, keyboard = await render_users_page(state, 0, 0)
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+@dp.callback_query(UsersPage.filter(F.action == "page"), lambda c: c.from_user.id == ADMIN_ID)
+async def users_page_callback(callback: types.CallbackQuery, callback_data: UsersPage, state: FSMContext):
+    text, keyboard = await render_users_page(state, callback_data.page, callback_data.days)
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+    await callback.answer()
+
+@dp.callback_query(UsersPage.filter(F.action == "csv"), lambda c: c.from_user.id == ADMIN_ID)
+async def users_csv_callback(callback: types.CallbackQuery, callback_data: UsersPage):
+    await callback.answer("📥 Fayl tayyorlanmoqda...")
+    fd, path = tempfile.mkstemp(prefix="users-", suffix=".csv")
+    os.close(fd)
+    try:
+        count = await write_users_csv(path, users_filter_since(callback_data.days))
+        filename = f"users_{datetime.now():%Y%m%d_%H%M}.csv"
+        await callback.message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"<b>📥 Foydalanuvchilar: {count} ta</b> ({users_filter_label(callback_data.days)})",
+            parse_mode="HTML"
+        )
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+QUIZ_SECTION_NAMES = {"Dictionary": "📖 Lug‘at", "Grammar": "📚 Grammatika", "Random": "🎲 Tasodifiy", "Review": "🧠 Takrorlash"}
+
+def format_quiz_key(key: str):
+    section, _, level = key.partition(":")
+    name = QUIZ_SECTION_NAMES.get(section, section)
+    return f"{name} ({LEVEL_EMOJIS.get(level, '')} {level})" if level else name
+
+@dp.message(lambda msg: msg.text == "📊 Statistika" and msg.from_user.id == ADMIN_ID)
+async def show_stats(message: types.Message):
+    quizzes = "\n".join(
+        f"• {html.escape(format_quiz_key(key))}: {count} / {stats.finished.get(key, 0)}"
+        for key, count in sorted(stats.started.items(), key=lambda item: -item[1])
+    ) or "—"
+    accuracy = "\n".join(
+        f"• {html.escape(name)}: {round(correct / total * 100)}% ({total} ta javob)"
+        for name, (total, correct) in sorted(stats.answers.items(), key=lambda item: -item[1][0])[:10]
+    ) or "—"
+    missed = "\n".join(
+        f"{i}. <i>{html.escape(question)}</i> — {count} marta"
+        for i, (question, count) in enumerate(stats.missed.top(10), 1)
+    ) or "—"
     await message.answer(
-        f"<b>👥 Foydalanuvchilar soni: {len(users)}</b>\n\n{user_list}",
+        "<b>📊 Statistika</b>\n\n"
+        f"👥 <b>Faol foydalanuvchilar:</b> bugun {stats.active_users(1)}, "
+        f"7 kun {stats.active_users(7)}, 30 kun {stats.active_users(30)}\n\n"
+        f"<b>🚀 Quizlar (boshlangan / yakunlangan):</b>\n{quizzes}\n\n"
+        f"<b>🎯 Aniqlik (lug‘at/bo‘lim):</b>\n{accuracy}\n\n"
+        f"<b>❌ Eng ko‘p xato qilingan savollar:</b>\n{missed}",
         reply_markup=ADMIN_MARKUP,
         parse_mode="HTML"
     )
 
+@dp.message(Command("reload"), lambda msg: msg.from_user.id == ADMIN_ID)
+async def reload_content(message: types.Message):
+    try:
+        snapshot, changed = await content_store.reload()
+    except ContentError as e:
+        logger.error(f"Yangi ma'lumotlar qabul qilinmadi: {e}")
+        await message.answer(f"<b>❗ Ma'lumotlar yangilanmadi:</b>\n<code>{html.escape(str(e))}</code>", parse_mode="HTML")
+        return
+    if not changed:
+        await message.answer(f"<b>ℹ️ Ma'lumotlar o‘zgarmagan</b> (versiya {snapshot.version})", parse_mode="HTML")
+        return
+    await message.answer(
+        f"<b>✅ Ma'lumotlar yangilandi!</b>\n"
+        f"🔖 Versiya: {snapshot.version}\n"
+        f"📖 Lug‘atlar: {len(snapshot.dict_names)} ta\n"
+        f"📚 Grammatika bo‘limlari: {len(snapshot.grammar_names)} ta",
+        parse_mode="HTML"
+    )
+
+# Qidiruv: /search so'z yoki inline rejimda @bot so'z
+def search_source(pool_id: str):
+    kind, name, level = parse_pool_id(pool_id)
+    if kind == "dict":
+        return f"📖 {name}, {LEVEL_EMOJIS.get(level, '')} {level}"
+    return f"📚 {name}"
+
+@dp.message(Command("search"))
+async def search_command(message: types.Message, command: CommandObject):
+    await save_user(message.from_user.id, message.from_user.username)
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("<b>🔍 Qidirish uchun:</b> /search so‘z\nO‘zbekcha yoki ruscha yozish mumkin.", parse_mode="HTML")
+        return
+    if not search_index.ready:
+        await message.answer("<b>⏳ Qidiruv tayyorlanmoqda...</b>\nBirozdan so‘ng qayta urinib ko‘ring.", parse_mode="HTML")
+        return
+    results = search_index.search(query, SEARCH_LIMIT)
+    if not results:
+        await message.answer(f"<b>🔍 «{html.escape(query)}» bo‘yicha hech narsa topilmadi</b>", parse_mode="HTML")
+        return
+    lines = "\n".join(
+        f"{i}. <b>{html.escape(question)}</b> → {html.escape(answer)}\n   <i>{html.escape(search_source(pool_id))}</i>"
+        for i, (pool_id, question, answer) in enumerate(results, 1)
+    )
+    await message.answer(f"<b>🔍 «{html.escape(query)}» bo‘yicha natijalar:</b>\n\n{lines}", parse_mode="HTML")
+
+@dp.inline_query()
+async def search_inline(inline_query: types.InlineQuery):
+    results = search_index.search(inline_query.query, 20) if inline_query.query.strip() else []
+    await inline_query.answer(
+        [
+            InlineQueryResultArticle(
+                id=str(i),
+                title=f"{question} → {answer}",
+                description=search_source(pool_id),
+                input_message_content=InputTextMessageContent(
+                    message_text=f"<b>{html.escape(question)}</b> → {html.escape(answer)}", parse_mode="HTML"
+                )
+            )
+            for i, (pool_id, question, answer) in enumerate(results)
+        ],
+        cache_time=300
+    )
+
 @dp.message(lambda msg: msg.text == "📩 Xabar yuborish" and msg.from_user.id == ADMIN_ID)
 async def send_broadcast_start(message: types.Message, state: FSMContext):
     await message.answer(
@@ -406,44 +729,24 @@ async def send_broadcast_start(message: types.Message, state: FSMContext):
 
 @dp.message(AdminStates.waiting_for_message)
 async def send_broadcast(message: types.Message, state: FSMContext):
-    users = await load_json('users.json', [])
-    if not users:
+    total = await users_registry.count()
+    if not total:
         await message.answer("<b>❗ Hozircha foydalanuvchilar yo‘q!</b>", reply_markup=ADMIN_MARKUP, parse_mode="HTML")
         await state.clear()
         return
     
-    sent, failed = 0, 0
-    broadcast_message = message.text
-    
-    logger.info(f"Xabar yuborish boshlandi. Jami foydalanuvchilar: {len(users)}")
-    logger.info(f"Yuboriladigan xabar: {broadcast_message}")
-    
-    for user in users:
-        user_id = user['id']
-        username = user.get('username', 'Nomalum')
-        try:
-            await bot.send_message(chat_id=user_id, text=broadcast_message, parse_mode="HTML")
-            sent += 1
-            logger.info(f"Xabar yuborildi: ID={user_id}, Username=@{username}")
-        except Exception as e:
-            failed += 1
-            error_msg = str(e).lower()
-            logger.error(f"Xabar yuborishda xato: ID={user_id}, Xato: {error_msg}")
-            if "blocked by user" in error_msg or "chat not found" in error_msg:
-                logger.warning(f"Foydalanuvchi ro‘yxatdan o‘chirilmoqda: ID={user_id}")
-                users = [u for u in users if u['id'] != user_id]
-                await save_to_json('users.json', users)
-                logger.info(f"Foydalanuvchi o‘chirildi: ID={user_id}")
+    if broadcast_task is not None and not broadcast_task.done():
+        await message.answer("<b>❗ Oldingi xabar yuborish hali tugamagan!</b>", reply_markup=ADMIN_MARKUP, parse_mode="HTML")
+        await state.clear()
+        return
     
-    result_text = (
-        f"<b>📬 Xabar yuborish natijasi:</b>\n"
-        f"✅ Muvaffaqiyatli: {sent} ta\n"
-        f"❌ Xato: {failed} ta\n"
-        f"👥 Jami foydalanuvchilar: {len(users)} ta"
+    logger.info(f"Yuboriladigan xabar: {len(message.text)} belgi")
+    run_broadcast(Broadcast(bot, users_registry, message.text, message.chat.id, **BROADCAST_OPTIONS))
+    await message.answer(
+        "<b>📩 Xabar yuborish boshlandi!</b>\nJarayon haqida shu yerda xabar berib boraman.",
+        reply_markup=ADMIN_MARKUP,
+        parse_mode="HTML"
     )
-    await message.answer(result_text, reply_markup=ADMIN_MARKUP, parse_mode="HTML")
-    logger.info(f"Xabar yuborish yakunlandi. Muvaffaqiyatli: {sent}, Xato: {failed}")
-    
     await state.clear()
 
 @dp.message(lambda msg: msg.text in ["↩️ Bosh menyuga", "↩️ Orqaga"])
@@ -527,36 +830,72 @@ async def quiz_menu_handler(message: types.Message, state: FSMContext):
         await message.answer("<b>📚 Grammatika tanlash</b>\n\nBo‘limni tanlang:", reply_markup=get_grammar_menu(), parse_mode="HTML")
         await state.set_state(QuizStates.choosing_grammar)
     elif message.text == "🎲 Tasodifiy savollar":
-        all_questions = []
-        for dict_name in DATA["Dictionary"]:
-            for level in DATA["Dictionary"][dict_name]:
-                all_questions.extend(list(DATA["Dictionary"][dict_name][level].items()))
-        for grammar_name in DATA["Grammar"]:
-            all_questions.extend(list(DATA["Grammar"][grammar_name].items()))
-        
-        if not all_questions:
+        available_questions = len(QUESTION_POOLS[RANDOM_POOL_ID])
+        if not available_questions:
             await message.answer("<b>❗ Hozircha tasodifiy savollar mavjud emas!</b>", parse_mode="HTML")
             return
         
-        available_questions = len(all_questions)
-        await state.update_data(section="Random", available_questions=available_questions, all_questions=all_questions)
+        await state.update_data(section="Random", pool_id=RANDOM_POOL_ID, content_version=content_store.current.version,
+                                available_questions=available_questions)
         await message.answer(
             f"<b>🎲 Tasodifiy savollar sonini tanlang</b>\n\nJami mavjud: {available_questions} ta",
             reply_markup=COUNT_MARKUP,
             parse_mode="HTML"
         )
         await state.set_state(QuizStates.random_questions)
+    elif message.text == "🧠 Takrorlash":
+        await start_review(message, state)
+    elif message.text == "🔘 Variantli test":
+        choice_mode = (await state.get_data()).get('quiz_mode') != "choice"
+        await state.update_data(quiz_mode="choice" if choice_mode else "text")
+        await message.answer(
+            "<b>🔘 Variantli test yoqildi!</b>\nSavollar bitta xabarda, javob variantlari tugmalarda beriladi."
+            if choice_mode else "<b>✍️ Variantli test o‘chirildi!</b>\nJavoblarni yozib yuborasiz.",
+            reply_markup=QUIZ_MENU,
+            parse_mode="HTML"
+        )
     elif message.text == "↩️ Bosh menyuga":
         await start_handler(message, state)
     else:
         await message.answer("<b>❗ Iltimos, menyudan tanlang!</b>", parse_mode="HTML")
 
+# Takrorlash: muddati kelgan savollar tasodifiy to'plam indekslari orqali beriladi,
+# shuning uchun quizning qolgan qismi (tekshirish, natija, xatolarni tuzatish) o'zgarmaydi
+async def start_review(message: types.Message, state: FSMContext):
+    user_id = message.from_user.id
+    snapshot = content_store.current
+    question_ids, missing = [], []
+    for item in await review_scheduler.due(user_id, REVIEW_BATCH):
+        index = snapshot.random_index(*split_review_item(item))
+        if index is None:
+            missing.append(item)
+        else:
+            question_ids.append(index)
+    if missing:
+        # Ma'lumotlardan olib tashlangan savollar navbatda qolmasin
+        await review_scheduler.forget(user_id, missing)
+
+    if not question_ids:
+        await message.answer(
+            "<b>✅ Hozircha takrorlanadigan savollar yo‘q!</b>\nXato javob bergan savollaringiz shu yerda vaqti-vaqti bilan qaytariladi.",
+            reply_markup=QUIZ_MENU,
+            parse_mode="HTML"
+        )
+        return
+
+    await state.update_data(
+        section="Review", pool_id=RANDOM_POOL_ID, content_version=snapshot.version,
+        question_ids=question_ids, current=0, correct=0, wrong_answers=[], available_questions=len(question_ids)
+    )
+    stats.quiz_started("Review")
+    await message.answer(f"<b>🧠 Takrorlash boshlandi ({len(question_ids)} ta savol)</b>", parse_mode="HTML")
+    await send_question(message, state)
+
 @dp.message(QuizStates.random_questions)
 async def choose_random_count(message: types.Message, state: FSMContext):
     await save_user(message.from_user.id, message.from_user.username)
     user_data = await state.get_data()
     available = user_data.get('available_questions', 0)
-    all_questions = user_data.get('all_questions', [])
 
     if message.text == "↩️ Orqaga":
         await message.answer("<b>🌟 Bo‘lim tanlash</b>\n\nQuyidagilardan birini tanlang:", reply_markup=QUIZ_MENU, parse_mode="HTML")
@@ -576,8 +915,14 @@ async def choose_random_count(message: types.Message, state: FSMContext):
         return
 
     if 0 < count <= available:
-        questions = random.sample(all_questions, count)
-        await state.update_data(questions=questions, current=0, correct=0, wrong_answers=[])
+        pool = get_pool(user_data)
+        if pool is None or count > len(pool):
+            await content_changed(message, state)
+            return
+        question_ids = await pick_questions(message.from_user.id, user_data, pool, count)
+        await state.update_data(question_ids=question_ids, current=0, correct=0, wrong_answers=[])
+        section = user_data.get('section', 'Dictionary')
+        stats.quiz_started(section, user_data.get('level') if section == "Dictionary" else None)
         await send_question(message, state)
     else:
         await message.answer(f"<b>❗ 1-{available} oralig‘ida son kiriting!</b>", parse_mode="HTML")
@@ -639,7 +984,8 @@ async def choose_grammar_handler(message: types.Message, state: FSMContext):
                     parse_mode="HTML"
                 )
                 return
-            available_questions = len(DATA["Grammar"].get(selected_category, {}))
+            pool_id = grammar_pool_id(selected_category)
+            available_questions = len(QUESTION_POOLS[pool_id])
             if available_questions == 0:
                 await message.answer(
                     f"<b>❗ '{selected_category}' bo‘limida savollar yo‘q!</b>\nBoshqa bo‘limni tanlang:",
@@ -647,7 +993,8 @@ async def choose_grammar_handler(message: types.Message, state: FSMContext):
                     parse_mode="HTML"
                 )
                 return
-            await state.update_data(section="Grammar", selected_category=selected_category, available_questions=available_questions)
+            await state.update_data(section="Grammar", selected_category=selected_category, pool_id=pool_id,
+                                    content_version=content_store.current.version, available_questions=available_questions)
             await message.answer(
                 f"<b>🌕 Savollar sonini tanlang</b>\n\nJami mavjud: {available_questions} ta",
                 reply_markup=COUNT_MARKUP,
@@ -676,7 +1023,8 @@ async def choose_level(message: types.Message, state: FSMContext):
             )
             await state.set_state(QuizStates.choosing_dict)
             return
-        available_questions = len(DATA["Dictionary"][selected_dict].get(level, {}))
+        pool_id = dictionary_pool_id(selected_dict, level)
+        available_questions = len(QUESTION_POOLS[pool_id]) if pool_id in QUESTION_POOLS else 0
         if available_questions == 0:
             await message.answer(
                 f"<b>❗ '{selected_dict}' lug‘atida '{level}' darajasida savollar yo‘q!</b>\nBoshqa darajani tanlang:",
@@ -684,7 +1032,8 @@ async def choose_level(message: types.Message, state: FSMContext):
                 parse_mode="HTML"
             )
             return
-        await state.update_data(level=level, available_questions=available_questions)
+        await state.update_data(level=level, pool_id=pool_id, content_version=content_store.current.version,
+                                available_questions=available_questions)
         await message.answer(
             f"<b>🌕 Savollar sonini tanlang</b>\n\nJami mavjud: {available_questions} ta",
             reply_markup=COUNT_MARKUP,
@@ -730,78 +1079,233 @@ async def choose_count(message: types.Message, state: FSMContext):
         return
 
     if 0 < count <= available:
-        if user_data['section'] == "Dictionary":
-            questions = random.sample(
-                list(DATA["Dictionary"][user_data['selected_dict']][user_data['level']].items()), count
-            )
-        elif user_data['section'] == "Grammar":
-            questions = random.sample(
-                list(DATA["Grammar"][user_data['selected_category']].items()), count
-            )
-        else:
-            questions = random.sample(user_data['all_questions'], count)
-        await state.update_data(questions=questions, current=0, correct=0, wrong_answers=[])
+        pool = get_pool(user_data)
+        if pool is None or count > len(pool):
+            await content_changed(message, state)
+            return
+        question_ids = await pick_questions(message.from_user.id, user_data, pool, count)
+        await state.update_data(question_ids=question_ids, current=0, correct=0, wrong_answers=[])
+        section = user_data.get('section', 'Dictionary')
+        stats.quiz_started(section, user_data.get('level') if section == "Dictionary" else None)
         await send_question(message, state)
     else:
         await message.answer(f"<b>❗ 1-{available} oralig‘ida son kiriting!</b>", parse_mode="HTML")
 
+def question_title(user_data: dict):
+    current = user_data.get('current', 0)
+    total = len(user_data.get('question_ids', []))
+    section = user_data.get('section', 'Dictionary')
+    if section in ("Random", "Review"):
+        title = "🎲 {}/{} - Tasodifiy savol" if section == "Random" else "🧠 {}/{} - Takrorlash"
+        return f"<b>{title.format(current + 1, total)} ❓</b>"
+    level = user_data.get('level', 'Easy') if section == "Dictionary" else None
+    return (
+        f"<b>{LEVEL_EMOJIS.get(level, '📚')} {current + 1}/{total} - "
+        f"{'Lug‘at savoli' if section == 'Dictionary' else 'Grammatika savoli'} ❓</b>"
+    )
+
 async def send_question(message: types.Message, state: FSMContext):
     await save_user(message.from_user.id, message.from_user.username)
     user_data = await state.get_data()
     current = user_data.get('current', 0)
-    questions = user_data.get('questions', [])
+    question_ids = user_data.get('question_ids', [])
     section = user_data.get('section', 'Dictionary')
-    level = user_data.get('level', 'Easy') if section == "Dictionary" else None
     
-    if current >= len(questions):
+    if current >= len(question_ids):
         await end_test(message, state)
         return
     
-    question = questions[current][0]
-    if section == "Random":
-        text = (
-            f"<b>🎲 {current + 1}/{len(questions)} - Tasodifiy savol ❓</b>\n\n"
-            f"💡 <b>{question}</b>\n\n"
-            f"<i>Javobingizni yozing yoki /end</i>"
-        )
-    else:
-        text = (
-            f"<b>{LEVEL_EMOJIS.get(level, '📚')} {current + 1}/{len(questions)} - "
-            f"{'Lug‘at savoli' if section == 'Dictionary' else 'Grammatika savoli'} ❓</b>\n\n"
-            f"💡 <b>{question}</b>\n\n"
-            f"<i>{'Рус тилида жавоб беринг' if section == 'Grammar' else 'Javobingizni yozing'} yoki /end</i>"
-        )
+    if user_data.get('quiz_mode') == "choice":
+        await send_choice_question(message, state)
+        return
+
+    pool = get_pool(user_data)
+    if pool is None or question_ids[current] >= len(pool):
+        await content_changed(message, state)
+        return
+    question = pool[question_ids[current]][0]
+    hint = "Рус тилида жавоб беринг" if section == "Grammar" else "Javobingizni yozing"
+    text = (
+        f"{question_title(user_data)}\n\n"
+        f"💡 <b>{question}</b>\n\n"
+        f"<i>{hint} yoki /end</i>"
+    )
     await message.answer(text, parse_mode="HTML")
-    await state.update_data(answered=False, timer_task=asyncio.create_task(question_timer(message, state)))
+    await start_question_timer(message, state)
     await state.set_state(QuizStates.asking_question)
 
+# Variantli test: butun quiz bitta xabarda, savol va natija shu xabarni tahrirlash
+# orqali ko'rsatiladi, javob esa inline tugma (callback_query) bilan keladi
+CHOICE_OPTIONS = 4
+CHOICE_BUTTON_LIMIT = 32  # bundan uzun variantlar matnda, tugmalarda esa harflar bilan
+
+def pick_distractors(user_data: dict, question_id: int, count: int = CHOICE_OPTIONS - 1):
+    # Noto'g'ri variantlar savolning asl to'plamidan (o'sha lug'at va daraja) olinadi:
+    # avval oldindan hisoblangan o'xshash javoblardan, indeks hali tayyor bo'lmasa tasodifiy
+    snapshot = content_store.snapshot(user_data.get('content_version'))
+    origin_pool_id, origin_index = snapshot.locate(user_data['pool_id'], question_id)
+    pool = snapshot.pools[origin_pool_id]
+    candidates = distractor_index.lookup(snapshot.version, origin_pool_id, origin_index) or []
+    candidates = random.sample(candidates, len(candidates))
+    if len(candidates) < count:
+        candidates += random.sample(range(len(pool)), min(len(pool), 4 * count + 1))
+    seen = {str(pool[origin_index][1]).strip().lower()}
+    distractors = []
+    for index in candidates:
+        answer = str(pool[index][1]).strip()
+        if answer.lower() not in seen:
+            seen.add(answer.lower())
+            distractors.append(answer)
+            if len(distractors) == count:
+                break
+    return distractors
+
+def get_choice_keyboard(current: int, options: list):
+    as_letters = any(len(option) > CHOICE_BUTTON_LIMIT for option in options)
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"{chr(65 + i)}" if as_letters else option,
+            callback_data=QuizAnswer(q=current, o=i).pack()
+        )] for i, option in enumerate(options)
+    ]
+    if as_letters:
+        buttons = [[row[0] for row in buttons]]
+    buttons.append([InlineKeyboardButton(text="⏹ Tugatish", callback_data=QuizAnswer(q=current, o=-1).pack())])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+async def send_choice_question(message: types.Message, state: FSMContext, verdict: str = None):
+    # verdict berilsa, message - quiz xabari va u tahrirlanadi; aks holda yangi xabar yuboriladi
+    user_data = await state.get_data()
+    current = user_data.get('current', 0)
+    question_id = user_data['question_ids'][current]
+    pool = get_pool(user_data)
+    if pool is None or question_id >= len(pool):
+        await content_changed(message, state)
+        return
+    question, answer = pool[question_id]
+    options = [str(answer).strip()] + pick_distractors(user_data, question_id)
+    random.shuffle(options)
+    correct = options.index(str(answer).strip())
+
+    text = f"{verdict}\n\n" if verdict else ""
+    text += f"{question_title(user_data)}\n\n💡 <b>{question}</b>\n\n"
+    if any(len(option) > CHOICE_BUTTON_LIMIT for option in options):
+        text += "\n".join(f"<b>{chr(65 + i)})</b> {html.escape(option)}" for i, option in enumerate(options)) + "\n\n"
+    text += f"<i>⏳ {TIME_LIMIT} sekund ichida javobni tanlang</i>"
+    keyboard = get_choice_keyboard(current, options)
+
+    await state.update_data(choices=options, choice_correct=correct)
+    await state.set_state(QuizStates.choosing_answer)
+    if verdict is None:
+        quiz_message = await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+    else:
+        quiz_message = message
+        await message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await state.update_data(quiz_message_id=quiz_message.message_id)
+    quiz_timers.schedule(state.key, TIME_LIMIT, on_expire=partial(choice_timeout, quiz_message, state))
+
+async def choice_timeout(message: types.Message, state: FSMContext, timer):
+    async with update_isolation.lock(state.key):
+        if not await timer_expired(state, QuizStates.choosing_answer):
+            return
+        with contextlib.suppress(TelegramBadRequest):
+            await message.edit_reply_markup(reply_markup=None)
+        await message.answer("⏰ Vaqt tugadi! ⏰")
+        await end_test(message, state)
+
+@dp.callback_query(QuizAnswer.filter(), QuizStates.choosing_answer)
+async def choice_answer(callback: types.CallbackQuery, callback_data: QuizAnswer, state: FSMContext):
+    await save_user(callback.from_user.id, callback.from_user.username)
+    user_data = await state.get_data()
+    current = user_data.get('current', 0)
+    if callback_data.q != current:
+        await callback.answer("Bu savolga javob berilgan")
+        return
+    await cancel_timer(state)
+    message = callback.message
+    if callback_data.o < 0:
+        await callback.answer()
+        with contextlib.suppress(TelegramBadRequest):
+            await message.edit_reply_markup(reply_markup=None)
+        await end_test(message, state)
+        return
+
+    question_ids = user_data.get('question_ids', [])
+    question_id = question_ids[current]
+    options, correct = user_data['choices'], user_data['choice_correct']
+    is_correct = callback_data.o == correct
+    await record_answer(callback.from_user.id, user_data, question_id, is_correct)
+    if is_correct:
+        verdict = "<b>✅ To‘g‘ri javob!</b> 🌟"
+        await state.update_data(correct=user_data.get('correct', 0) + 1, current=current + 1)
+    else:
+        verdict = f"<b>❌ Xato!</b> To‘g‘ri javob: <i>{html.escape(options[correct])}</i>"
+        wrong_answers = user_data.get('wrong_answers', []) + [[question_id, options[callback_data.o]]]
+        await state.update_data(wrong_answers=wrong_answers, current=current + 1)
+    await callback.answer("✅ To‘g‘ri!" if is_correct else "❌ Xato!")
+
+    if current + 1 < len(question_ids):
+        await send_choice_question(message, state, verdict)
+    else:
+        with contextlib.suppress(TelegramBadRequest):
+            await message.edit_text(verdict, parse_mode="HTML")
+        await end_test(message, state)
+
+@dp.callback_query(QuizAnswer.filter())
+async def stale_choice_answer(callback: types.CallbackQuery):
+    await callback.answer("Bu quiz yakunlangan")
+
+@dp.message(QuizStates.choosing_answer)
+async def choice_text_answer(message: types.Message, state: FSMContext):
+    await save_user(message.from_user.id, message.from_user.username)
+    if message.text != "/end":
+        await message.answer("<b>👆 Javobni tugmalardan tanlang</b> yoki /end", parse_mode="HTML")
+        return
+    await cancel_timer(state)
+    quiz_message_id = (await state.get_data()).get('quiz_message_id')
+    if quiz_message_id is not None:
+        with contextlib.suppress(TelegramBadRequest):
+            await bot.edit_message_reply_markup(chat_id=message.chat.id, message_id=quiz_message_id, reply_markup=None)
+    await end_test(message, state)
+
+async def record_answer(user_id: int, user_data: dict, question_id: int, correct: bool):
+    origin = content_store.snapshot(user_data.get('content_version')).origin(user_data['pool_id'], question_id)
+    await review_scheduler.record(user_id, review_item(*origin), correct)
+    kind, name, _ = parse_pool_id(origin[0])
+    stats.answer(f"{'📖' if kind == 'dict' else '📚'} {name}", origin[1], correct)
+
 @dp.message(QuizStates.asking_question)
 async def check_answer(message: types.Message, state: FSMContext):
     await save_user(message.from_user.id, message.from_user.username)
     await cancel_timer(state)
     user_data = await state.get_data()
     current = user_data.get('current', 0)
-    questions = user_data.get('questions', [])
+    question_ids = user_data.get('question_ids', [])
     
     if message.text == "/end":
         await message.answer("<b>⏹ Quizni yakunlashni xohlaysizmi?</b>", reply_markup=CONFIRM_END_MARKUP, parse_mode="HTML")
         await state.set_state(QuizStates.confirming_end)
         return
 
-    correct_answer = str(questions[current][1]).lower().strip()
+    question_id = question_ids[current]
+    pool = get_pool(user_data)
+    if pool is None or question_id >= len(pool):
+        await content_changed(message, state)
+        return
+    correct_answer = str(pool[question_id][1]).lower().strip()
     user_answer = message.text.lower().strip()
-    await state.update_data(answered=True)
+    distance = answer_distance(pool.accepted[question_id], message.text, ANSWER_MAX_TYPOS)
+    await record_answer(message.from_user.id, user_data, question_id, distance is not None)
     
     wrong_answers = user_data.get('wrong_answers', [])
-    if user_answer == correct_answer:
+    if distance == 0:
         await state.update_data(correct=user_data.get('correct', 0) + 1)
         await message.answer("<b>✅ To‘g‘ri javob!</b> 🌟", parse_mode="HTML")
+    elif distance is not None:
+        await state.update_data(correct=user_data.get('correct', 0) + 1)
+        await message.answer(f"<b>✅ To‘g‘ri javob!</b> 🌟\nTo‘g‘ri yozilishi: <i>{html.escape(correct_answer)}</i>", parse_mode="HTML")
     else:
-        wrong_answers.append({
-            'question': questions[current][0],
-            'correct': correct_answer,
-            'user_answer': user_answer
-        })
+        wrong_answers.append([question_id, user_answer])
         await state.update_data(wrong_answers=wrong_answers)
         await message.answer(f"<b>❌ Xato!</b>\nTo‘g‘ri javob: <i>{correct_answer}</i>", parse_mode="HTML")
     
@@ -822,7 +1326,7 @@ async def end_test(message: types.Message, state: FSMContext):
     await cancel_timer(state)
     user_data = await state.get_data()
     correct = user_data.get('correct', 0)
-    total = min(user_data.get('current', 0), len(user_data.get('questions', [])))
+    total = min(user_data.get('current', 0), len(user_data.get('question_ids', [])))
     percent = round((correct / total) * 100, 2) if total > 0 else 0
     wrong_answers = user_data.get('wrong_answers', [])
     
@@ -842,13 +1346,17 @@ async def end_test(message: types.Message, state: FSMContext):
     )
     
     wrong_answers_text = ""
+    pool = get_pool(user_data)
+    if pool is None:
+        wrong_answers = []
     if wrong_answers:
         wrong_answers_text = "\n<b>❌ Noto‘g‘ri javoblaringiz:</b>\n"
-        for i, wa in enumerate(wrong_answers, 1):
+        for i, (question_id, user_answer) in enumerate(wrong_answers, 1):
+            question, correct_answer = pool[question_id]
             wrong_answers_text += (
-                f"{i}. <i>{wa['question']}</i>\n"
-                f"   Sizning javobingiz: <b>{wa['user_answer']}</b>\n"
-                f"   To‘g‘ri javob: <b>{wa['correct']}</b>\n"
+                f"{i}. <i>{question}</i>\n"
+                f"   Sizning javobingiz: <b>{user_answer}</b>\n"
+                f"   To‘g‘ri javob: <b>{str(correct_answer).lower().strip()}</b>\n"
             )
     
     final_message = (
@@ -862,12 +1370,29 @@ async def end_test(message: types.Message, state: FSMContext):
         "<i>Yana sinab ko‘rish uchun /start ni bosing!</i>"
     )
     
+    if total > 0:
+        section = user_data.get('section', 'Dictionary')
+        stats.quiz_finished(section, user_data.get('level') if section == "Dictionary" else None)
+        await storage_backend.add_quiz_result({
+            'user_id': message.chat.id,
+            'section': section,
+            'name': user_data.get('selected_dict') if section == "Dictionary" else user_data.get('selected_category'),
+            'level': user_data.get('level') if section == "Dictionary" else None,
+            'total': total,
+            'correct': correct,
+            'finished_at': datetime.now().isoformat()
+        })
+
     has_wrong_answers = bool(wrong_answers)
-    await state.update_data(wrong_questions=wrong_answers if has_wrong_answers else [])
+    await state.update_data(
+        wrong_questions=[question_id for question_id, _ in wrong_answers],
+        wrong_pool_id=user_data.get('pool_id'),
+        wrong_content_version=user_data.get('content_version')
+    )
     await message.answer(
         final_message,
         parse_mode="HTML",
-        reply_markup=get_main_menu(message.from_user.id == ADMIN_ID, has_wrong_answers)
+        reply_markup=get_main_menu(message.chat.id == ADMIN_ID, has_wrong_answers)
         if not has_wrong_answers else REPEAT_WRONG_MARKUP
     )
     await state.set_state(None)
@@ -886,22 +1411,24 @@ async def repeat_wrong_questions(message: types.Message, state: FSMContext):
         )
         return
     
-    questions = [(wq['question'], wq['correct']) for wq in wrong_questions]
     section = user_data.get('section', 'Dictionary')
     level = user_data.get('level', 'Easy') if section == "Dictionary" else None
     
     await state.update_data(
-        questions=questions,
+        pool_id=user_data['wrong_pool_id'],
+        content_version=user_data.get('wrong_content_version'),
+        question_ids=wrong_questions,
         current=0,
         correct=0,
         wrong_answers=[],
         section=section,
         level=level,
-        available_questions=len(questions)
+        available_questions=len(wrong_questions)
     )
     
+    stats.quiz_started(section, level)
     await message.answer(
-        f"<b>🔄 Xato savollarni tuzatish boshlandi ({len(questions)} ta savol)</b>",
+        f"<b>🔄 Xato savollarni tuzatish boshlandi ({len(wrong_questions)} ta savol)</b>",
         parse_mode="HTML"
     )
     await send_question(message, state)
@@ -979,15 +1506,16 @@ async def learning_choose_grammar(message: types.Message, state: FSMContext):
                     parse_mode="HTML"
                 )
                 return
-            items = list(DATA["Grammar"].get(selected_category, {}).items())
-            if not items:
+            pool_id = grammar_pool_id(selected_category)
+            if not len(QUESTION_POOLS[pool_id]):
                 await message.answer(
                     f"<b>❗ '{selected_category}' bo‘limida ma’lumot yo‘q!</b>\nBoshqa bo‘limni tanlang:",
                     reply_markup=get_grammar_menu(page),
                     parse_mode="HTML"
                 )
                 return
-            await state.update_data(section="Grammar", selected_category=selected_category, items=items, current_page=0)
+            await state.update_data(section="Grammar", selected_category=selected_category, pool_id=pool_id,
+                                    content_version=content_store.current.version, current_page=0)
             await show_learning_page(message, state)
         elif message.text == "↩️ Orqaga":
             await message.answer("<b>📚 O‘quv rejimi</b>\n\nQuyidagilardan birini tanlang:", reply_markup=LEARNING_MENU, parse_mode="HTML")
@@ -1012,15 +1540,15 @@ async def learning_choose_level(message: types.Message, state: FSMContext):
             )
             await state.set_state(LearningStates.choosing_dict)
             return
-        items = list(DATA["Dictionary"][selected_dict].get(level, {}).items())
-        if not items:
+        pool_id = dictionary_pool_id(selected_dict, level)
+        if pool_id not in QUESTION_POOLS or not len(QUESTION_POOLS[pool_id]):
             await message.answer(
                 f"<b>❗ '{selected_dict}' lug‘atida '{level}' darajasida so‘zlar yo‘q!</b>\nBoshqa darajani tanlang:",
                 reply_markup=LUGAT_LEVELS,
                 parse_mode="HTML"
             )
             return
-        await state.update_data(level=level, items=items, current_page=0)
+        await state.update_data(level=level, pool_id=pool_id, content_version=content_store.current.version, current_page=0)
         await show_learning_page(message, state)
     elif message.text == "↩️ Orqaga":
         page = user_data.get('dict_page', 0)
@@ -1059,7 +1587,11 @@ async def show_learning_page(message: types.Message, state: FSMContext):
     await save_user(message.from_user.id, message.from_user.username)
     user_data = await state.get_data()
     section = user_data.get('section')
-    items = user_data.get('items', [])
+    pool = get_pool(user_data)
+    if pool is None:
+        await content_changed(message, state)
+        return
+    items = pool.items
     current_page = user_data.get('current_page', 0)
     level = user_data.get('level') if section == "Dictionary" else None
     selected_dict = user_data.get('selected_dict') if section == "Dictionary" else user_data.get('selected_category')
@@ -1085,6 +1617,40 @@ async def show_learning_page(message: types.Message, state: FSMContext):
     )
     await state.set_state(LearningStates.showing_items)
 
+# Ishga tushirish va to'xtatish
+@dp.startup()
+async def start_background_jobs():
+    content_store.start()
+    await users_registry.load()
+    users_registry.start()
+    review_scheduler.start()
+    await stats.load()
+    stats.start()
+    await feedback_inbox.start()
+    quiz_timers.start()
+    fsm_storage.start()
+    if not os.getenv("RENDER"):
+        metrics.start(METRICS_LOG_INTERVAL)
+    broadcast = await Broadcast.resume(bot, users_registry, **BROADCAST_OPTIONS)
+    if broadcast is not None:
+        logger.info(f"To'xtatilgan xabar yuborish davom ettirilmoqda ({broadcast.done_upto} dan keyin)")
+        run_broadcast(broadcast)
+
+@dp.shutdown()
+async def stop_background_jobs():
+    if broadcast_task is not None and not broadcast_task.done():
+        broadcast_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await broadcast_task
+    await content_store.stop()
+    await metrics.stop()
+    await quiz_timers.stop()
+    await users_registry.stop()
+    await review_scheduler.stop()
+    await stats.stop()
+    await feedback_inbox.stop()
+    await storage_backend.close()
+
 # Webhook setup
 async def on_startup(app):
     webhook_url = f"https://{os.getenv('RENDER_EXTERNAL_HOSTNAME')}{WEBHOOK_PATH}"
@@ -1098,7 +1664,21 @@ async def on_shutdown(app):
 
 async def main():
     if os.getenv("RENDER"):  # Run as webhook on Render
+        # Webhook serveri faqat shu rejimda kerak, polling'da import qilinmaydi
+        from aiohttp import web
+        from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+        async def metrics_handler(request):
+            header = request.headers.get("Authorization", "")
+            token = header[len("Bearer "):] if header.startswith("Bearer ") else request.query.get("token", "")
+            if not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+                return web.Response(status=401)
+            return web.Response(body=metrics.render().encode("utf-8"),
+                                headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
         app = web.Application()
+        if METRICS_TOKEN:
+            app.router.add_get("/metrics", metrics_handler)
         webhook_requests_handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
         webhook_requests_handler.register(app, path=WEBHOOK_PATH)
         setup_application(app, dp, bot=bot)
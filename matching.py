@@ -0,0 +1,91 @@
+import re
+import unicodedata
+
+# Javoblarni solishtirish: har bir to'g'ri javob uchun normallashtirilgan shakl
+# va qabul qilinadigan variantlar ma'lumot yuklanganda bir marta hisoblanadi,
+# foydalanuvchi javobi esa faqat bir marta normallashtiriladi.
+
+_APOSTROPHES = str.maketrans({
+    "’": "'", "‘": "'", "ʻ": "'", "ʼ": "'", "`": "'", "´": "'",
+    "‑": "-", "–": "-", "—": "-",
+    "ё": "е", "Ё": "е",
+})
+_SPACES = re.compile(r"\s+")
+_SPACE_AROUND_COMMA = re.compile(r"\s*,\s*")
+_OPTIONAL_SUFFIX = re.compile(r"^(\w+)\((\w+)\)$")
+
+def normalize(text) -> str:
+    text = unicodedata.normalize("NFC", str(text)).translate(_APOSTROPHES).lower()
+    text = _SPACES.sub(" ", text).strip()
+    text = _SPACE_AROUND_COMMA.sub(", ", text)
+    return text.rstrip(".!?").rstrip()
+
+def accepted_variants(answer) -> frozenset:
+    full = normalize(answer)
+    variants = {full}
+    # "ий/ой" - har bir qism alohida to'g'ri javob
+    if "/" in full:
+        variants.update(part.strip() for part in full.split("/") if part.strip())
+    # "идёт, идут" - bir so'zli qismlar ro'yxati: har biri va istalgan tartibi qabul qilinadi.
+    # "не только я, но и он" kabi iboralar bo'linmaydi.
+    if ", " in full:
+        parts = full.split(", ")
+        if all(part and " " not in part for part in parts):
+            variants.update(parts)
+            variants.add(", ".join(sorted(parts)))
+    # "подарил(а)" - qavs ichidagi qo'shimcha ixtiyoriy
+    match = _OPTIONAL_SUFFIX.match(full)
+    if match:
+        variants.add(match.group(1))
+        variants.add(match.group(1) + match.group(2))
+    return frozenset(variants)
+
+def _canonical(normalized: str) -> str:
+    if ", " in normalized:
+        parts = normalized.split(", ")
+        if all(part and " " not in part for part in parts):
+            return ", ".join(sorted(parts))
+    return normalized
+
+def bounded_distance(a: str, b: str, max_distance: int):
+    # Damerau-Levenshtein (optimal string alignment); max_distance dan oshsa
+    # hisoblash darhol to'xtatiladi va None qaytadi
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if a == b:
+        return 0
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return None
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+def answer_distance(accepted: frozenset, user_answer: str, max_typos: int = 0, min_length: int = 5):
+    # 0 - aniq mos, 1..max_typos - kichik xato bilan qabul qilindi, None - noto'g'ri
+    answer = normalize(user_answer)
+    if answer in accepted or _canonical(answer) in accepted:
+        return 0
+    if max_typos <= 0 or len(answer) < min_length:
+        return None
+    best = None
+    for variant in accepted:
+        if len(variant) < min_length:
+            continue
+        distance = bounded_distance(answer, variant, max_typos if best is None else best - 1)
+        if distance is not None:
+            best = distance
+            if best == 1:
+                break
+    return best
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # oxirgisi - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        # Taxminiy qiymat: kerakli kuzatuv tushgan bucketning yuqori chegarasi
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _labels(**labels):
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+# Handlerlar va Telegram API so'rovlari metrikalari. handler_middleware dispatcher'ga,
+# observe_request esa bot sessiyasiga ulanadi; render() Prometheus matn formatini,
+# summary() esa polling rejimida logga yoziladigan qisqa xulosani qaytaradi.
+class Metrics:
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.update_latency = Histogram()
+        self.handler_latency = defaultdict(Histogram)
+        self.updates = defaultdict(int)  # (handler, state) -> soni
+        self.handler_errors = defaultdict(int)
+        self.api_latency = defaultdict(Histogram)
+        self.api_errors = defaultdict(int)  # (method, xato turi) -> soni
+        self.api_retries = defaultdict(int)
+        self.lock_wait = Histogram()  # foydalanuvchining oldingi yangilanishi tugashini kutish
+        self._gauges = {}
+        self._log_task = None
+        self._last_summary = (0, 0)
+
+    def gauge(self, name: str, help_text: str, getter):
+        self._gauges[name] = (help_text, getter)
+
+    async def handler_middleware(self, handler, event, data: dict):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        state = data.get("raw_state") or "none"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.handler_errors[name] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.update_latency.observe(elapsed)
+            self.handler_latency[name].observe(elapsed)
+            self.updates[(name, state)] += 1
+
+    async def observe_request(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            self.api_retries[name] += 1
+            self.api_errors[(name, "TelegramRetryAfter")] += 1
+            raise
+        except Exception as e:
+            self.api_errors[(name, type(e).__name__)] += 1
+            raise
+        finally:
+            self.api_latency[name].observe(time.perf_counter() - started)
+
+    def render(self):
+        lines = []
+
+        def histogram(metric: str, help_text: str, histograms: dict, label: str):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for key, hist in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_labels(**{label: key, 'le': bound})} {cumulative}")
+                lines.append(f"{metric}_sum{_labels(**{label: key})} {hist.sum:.6f}")
+                lines.append(f"{metric}_count{_labels(**{label: key})} {hist.count}")
+
+        def counter(metric: str, help_text: str, values: dict, label_names: tuple):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for key, value in sorted(values.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                lines.append(f"{metric}{_labels(**dict(zip(label_names, key)))} {value}")
+
+        histogram("bot_handler_latency_seconds", "Handler ishlash vaqti", self.handler_latency, "handler")
+        counter("bot_updates_total", "Handler va FSM holati bo'yicha yangilanishlar", self.updates, ("handler", "state"))
+        counter("bot_handler_errors_total", "Handlerlardagi xatolar", self.handler_errors, ("handler",))
+        histogram("bot_api_request_seconds", "Telegram API so'rovlari vaqti", self.api_latency, "method")
+        counter("bot_api_errors_total", "Telegram API xatolari", self.api_errors, ("method", "error"))
+        counter("bot_api_retries_total", "Telegram RetryAfter javoblari", self.api_retries, ("method",))
+        histogram("bot_update_lock_wait_seconds", "Bitta foydalanuvchi yangilanishlari navbatida kutish vaqti",
+                  {"user": self.lock_wait}, "lock")
+        gauges = {"bot_uptime_seconds": ("Ishga tushgandan beri o'tgan vaqt", lambda: time.monotonic() - self.started_at)}
+        gauges.update(self._gauges)
+        for name, (help_text, getter) in gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {getter()}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        total = self.update_latency.count
+        api_total = sum(h.count for h in self.api_latency.values())
+        previous_total, previous_api = self._last_summary
+        self._last_summary = (total, api_total)
+        gauges = ", ".join(f"{name}={getter()}" for name, (_, getter) in self._gauges.items())
+        return (
+            f"Metrikalar: yangilanishlar {total - previous_total} ta (jami {total}, "
+            f"xato {sum(self.handler_errors.values())}), "
+            f"javob vaqti p50 {self.update_latency.quantile(0.5) * 1000:.0f} ms / "
+            f"p95 {self.update_latency.quantile(0.95) * 1000:.0f} ms, "
+            f"Telegram API {api_total - previous_api} ta so'rov (xato {sum(self.api_errors.values())}, "
+            f"qayta urinish {sum(self.api_retries.values())}), {gauges}"
+        )
+
+    async def _log_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(self.summary())
+
+    def start(self, interval: float):
+        if interval > 0 and (self._log_task is None or self._log_task.done()):
+            self._log_task = asyncio.create_task(self._log_loop(interval))
+
+    async def stop(self):
+        if self._log_task is not None:
+            self._log_task.cancel()
+            try:
+                await self._log_task
+            except asyncio.CancelledError:
+                pass
+            self._log_task = None
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Foydalanuvchilar reestri: o'zgarishlar xotirada to'planadi va backendga
+# har flush_interval sekundda bir marta, bitta paket bo'lib yoziladi
+class UserRegistry:
+    def __init__(self, backend, flush_interval: float = 5.0):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._known = set()
+        self._pending = {}
+        self._removed = set()
+        self._flush_task = None
+
+    def __len__(self):
+        return len(self._known)
+
+    def __contains__(self, user_id: int):
+        return user_id in self._known
+
+    async def load(self):
+        self._known = await self.backend.load_user_ids()
+        self._pending.clear()
+        self._removed.clear()
+        logger.info(f"Foydalanuvchilar yuklandi: {len(self._known)} ta")
+
+    def touch(self, user_id: int, username: str):
+        is_new = user_id not in self._known
+        self._known.add(user_id)
+        self._removed.discard(user_id)
+        self._pending[user_id] = {
+            'id': user_id,
+            'username': username or None,
+            'last_active': datetime.now().isoformat()
+        }
+        return is_new
+
+    def remove_many(self, user_ids):
+        for user_id in user_ids:
+            if user_id in self._known:
+                self._known.discard(user_id)
+                self._pending.pop(user_id, None)
+                self._removed.add(user_id)
+
+    async def get(self, user_id: int):
+        await self.flush()
+        return await self.backend.get_user(user_id)
+
+    async def count(self, active_since: str = None):
+        await self.flush()
+        return await self.backend.count_users(active_since)
+
+    async def iter_users(self, active_since: str = None, after_id: int = None, batch_size: int = 500):
+        await self.flush()
+        async for user in self.backend.iter_users(active_since, after_id, batch_size):
+            yield user
+
+    async def flush(self):
+        if not self._pending and not self._removed:
+            return
+        pending, removed = self._pending, self._removed
+        self._pending, self._removed = {}, set()
+        try:
+            if pending:
+                await self.backend.upsert_users(list(pending.values()))
+            if removed:
+                await self.backend.delete_users(removed)
+        except Exception:
+            # Keyingi flush'da qayta urinish uchun qaytarib qo'yamiz (yangiroq yozuvlar ustun)
+            for user_id, record in pending.items():
+                self._pending.setdefault(user_id, record)
+            self._removed |= removed - self._known
+            raise
+        logger.debug(f"Foydalanuvchilar saqlandi: {len(pending)} ta yangilangan, {len(removed)} ta o'chirilgan")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Foydalanuvchilarni saqlashda xato: {e}")
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
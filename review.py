@@ -0,0 +1,220 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from sampler import PoolSampler
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+# Leitner qutilari (kunlarda): xato javob berilgan savol 0-qutiga tushadi va darhol
+# takrorlanadi, har bir to'g'ri javobdan keyin keyingi qutiga o'tadi va
+# intervals[box] kundan keyin qaytadi. Oxirgi qutidan o'tgan savol navbatdan chiqadi.
+DEFAULT_INTERVALS = (0, 1, 3, 7, 14, 30)
+
+# Savol kaliti kontent versiyasiga bog'liq emas: asl to'plam va savol matni
+def review_item(pool_id: str, question: str):
+    return f"{pool_id}\t{question}"
+
+def split_review_item(item: str):
+    pool_id, _, question = item.partition("\t")
+    return pool_id, question
+
+# Bitta foydalanuvchining javoblar tarixi va takrorlash navbati.
+# items[item] = [box, due, attempts, errors, seen_at]; navbatda bo'lmagan savolda
+# box va due None. _heap - muddat bo'yicha min-heap: o'zgargan yozuvning eski heap
+# elementi o'chirilmaydi, o'qishda tashlab ketiladi; eskirganlar ko'payib ketsa
+# heap qayta quriladi. samplers - shu tarix asosidagi to'plam tanlovchilari.
+class ReviewQueue:
+    __slots__ = ("items", "samplers", "_heap")
+
+    def __init__(self, records=()):
+        self.items = {}
+        self.samplers = OrderedDict()
+        self._heap = []
+        for item, box, due, attempts, errors, seen_at in records:
+            self.items[item] = [box, due, attempts, errors, seen_at]
+            if due is not None:
+                self._heap.append((due, item))
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self.items)
+
+    def schedule(self, item: str, box: int, due: float):
+        state = self.items[item]
+        state[0], state[1] = box, due
+        heapq.heappush(self._heap, (due, item))
+        self._compact()
+
+    def unschedule(self, item: str):
+        state = self.items[item]
+        state[0] = state[1] = None
+
+    def remove(self, item: str):
+        if self.items.pop(item, None) is not None:
+            self._compact()
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self.items) + 64:
+            self._heap = [(state[1], item) for item, state in self.items.items() if state[1] is not None]
+            heapq.heapify(self._heap)
+
+    def due(self, now: float, limit: int):
+        # O(k log n): muddati kelgan eng erta k ta yozuv olinadi va heapga qaytariladi
+        taken, seen = [], set()
+        while self._heap and len(taken) < limit:
+            due, item = self._heap[0]
+            if due > now:
+                break
+            heapq.heappop(self._heap)
+            current = self.items.get(item)
+            if current is None or current[1] != due or item in seen:
+                continue
+            seen.add(item)
+            taken.append((due, item))
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return [item for _, item in taken]
+
+
+# Takrorlash rejalashtiruvchisi: har bir javob natijasini yozib boradi. Foydalanuvchilar
+# navbatlari kerak bo'lganda backenddan yuklanadi va LRU keshda saqlanadi,
+# o'zgarishlar esa UserRegistry kabi har flush_interval sekundda bitta paket bo'lib yoziladi
+class ReviewScheduler:
+    def __init__(self, backend, intervals=DEFAULT_INTERVALS, flush_interval: float = 5.0,
+                 max_cached_users: int = 5000, recent_window: float = 6 * 3600, samplers_per_user: int = 4):
+        self.backend = backend
+        self.intervals = tuple(intervals)
+        self.flush_interval = flush_interval
+        self.max_cached_users = max_cached_users
+        self.recent_window = recent_window
+        self.samplers_per_user = samplers_per_user
+        self._queues = OrderedDict()
+        self._changes = {}  # user_id -> {item: (box, due, attempts, errors, seen_at) yoki None - o'chirilgan}
+        self._flush_task = None
+
+    async def _queue(self, user_id: int):
+        queue = self._queues.get(user_id)
+        if queue is None:
+            records = await self.backend.load_reviews(user_id)
+            # Kutish paytida boshqa so'rov yuklab ulgurgan bo'lishi mumkin
+            queue = self._queues.get(user_id)
+            if queue is None:
+                queue = self._queues[user_id] = ReviewQueue(records)
+                self._evict()
+        self._queues.move_to_end(user_id)
+        return queue
+
+    def _evict(self):
+        # Faqat saqlanmagan o'zgarishi yo'q navbatlar keshdan chiqariladi
+        excess = len(self._queues) - self.max_cached_users
+        if excess <= 0:
+            return
+        for user_id in list(islice(self._queues, excess + len(self._changes))):
+            if excess <= 0:
+                break
+            if user_id not in self._changes:
+                del self._queues[user_id]
+                excess -= 1
+
+    def _mark(self, user_id: int, item: str, value):
+        self._changes.setdefault(user_id, {})[item] = value
+
+    async def record(self, user_id: int, item: str, correct: bool, now: float = None):
+        now = time.time() if now is None else now
+        queue = await self._queue(user_id)
+        state = queue.items.get(item)
+        if state is None:
+            state = queue.items[item] = [None, None, 0, 0, None]
+        state[2] += 1
+        state[3] += 0 if correct else 1
+        state[4] = now
+
+        if not correct:
+            queue.schedule(item, 0, now + self.intervals[0] * DAY)
+        elif state[0] is not None:
+            # Navbatda bo'lmagan savolga to'g'ri javob faqat tarixga yoziladi
+            box = state[0] + 1
+            if box >= len(self.intervals):
+                queue.unschedule(item)
+            else:
+                queue.schedule(item, box, now + self.intervals[box] * DAY)
+        self._mark(user_id, item, tuple(state))
+        for sampler in queue.samplers.values():
+            sampler.observe(item, state)
+
+    async def sample(self, user_id: int, snapshot, pool_id: str, count: int):
+        # Savollar foydalanuvchi tarixiga qarab tanlanadi (sampler.PoolSampler)
+        queue = await self._queue(user_id)
+        key = (snapshot.version, pool_id)
+        sampler = queue.samplers.get(key)
+        if sampler is None:
+            def locate(item: str):
+                return snapshot.index_of(pool_id, *split_review_item(item))
+            sampler = queue.samplers[key] = PoolSampler(
+                len(snapshot.pools[pool_id]), locate, queue.items, self.recent_window
+            )
+            while len(queue.samplers) > self.samplers_per_user:
+                queue.samplers.popitem(last=False)
+        queue.samplers.move_to_end(key)
+        return sampler.sample(count)
+
+    async def forget(self, user_id: int, items):
+        queue = await self._queue(user_id)
+        for item in items:
+            if item in queue.items:
+                queue.remove(item)
+                self._mark(user_id, item, None)
+
+    async def due(self, user_id: int, limit: int, now: float = None):
+        queue = await self._queue(user_id)
+        return queue.due(time.time() if now is None else now, limit)
+
+    async def flush(self):
+        if not self._changes:
+            return
+        changes, self._changes = self._changes, {}
+        upserts, deletes = [], []
+        for user_id, items in changes.items():
+            for item, value in items.items():
+                if value is None:
+                    deletes.append((user_id, item))
+                else:
+                    upserts.append((user_id, item, *value))
+        try:
+            await self.backend.save_reviews(upserts, deletes)
+        except Exception:
+            # Keyingi flush'da qayta urinish uchun qaytarib qo'yamiz (yangiroq yozuvlar ustun)
+            for user_id, items in changes.items():
+                pending = self._changes.setdefault(user_id, {})
+                for item, value in items.items():
+                    pending.setdefault(item, value)
+            raise
+        logger.debug(f"Takrorlash navbatlari saqlandi: {len(upserts)} ta yangilangan, {len(deletes)} ta o'chirilgan")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Takrorlash navbatlarini saqlashda xato: {e}")
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
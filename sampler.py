@@ -0,0 +1,139 @@
+import random
+import time
+
+# Moslashuvchan tanlash: foydalanuvchi ko'rmagan savollarning og'irligi 1,
+# ko'rganlariniki - xato ulushiga qarab (ko'p xato qilingan savol tez-tez chiqadi).
+# Yaqinda ko'rilgan savollar esa rad etish orqali kamroq tanlanadi.
+SEEN_WEIGHT = 0.2
+ERROR_WEIGHT = 4.0
+MIN_RECENCY = 0.1
+
+def item_weight(attempts: int, errors: int):
+    return SEEN_WEIGHT + ERROR_WEIGHT * errors / (attempts + 1)
+
+def recency_factor(seen_at: float, now: float, window: float):
+    if seen_at is None or window <= 0:
+        return 1.0
+    return max(MIN_RECENCY, min(1.0, (now - seen_at) / window))
+
+
+# Fenwick daraxti: og'irlikni yangilash, oxiriga qo'shish va yig'indi bo'yicha
+# elementni topish - hammasi O(log n)
+class FenwickTree:
+    __slots__ = ("weights", "_tree")
+
+    def __init__(self):
+        self.weights = []
+        self._tree = [0.0]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def _prefix(self, count: int):
+        total = 0.0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    @property
+    def total(self):
+        return self._prefix(len(self.weights))
+
+    def append(self, weight: float):
+        # Yangi tugun o'zi qamraydigan oraliq yig'indisini saqlaydi
+        position = len(self.weights) + 1
+        self.weights.append(weight)
+        self._tree.append(weight + self._prefix(position - 1) - self._prefix(position - (position & -position)))
+        return position - 1
+
+    def set(self, index: int, weight: float):
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        position = index + 1
+        while position < len(self._tree):
+            self._tree[position] += delta
+            position += position & -position
+
+    def find(self, value: float):
+        # prefix(index) <= value < prefix(index + 1) bo'lgan index
+        position, step = 0, 1 << len(self.weights).bit_length()
+        while step:
+            following = position + step
+            if following < len(self._tree) and self._tree[following] <= value:
+                position = following
+                value -= self._tree[following]
+            step >>= 1
+        return min(position, len(self.weights) - 1)
+
+
+# Bitta foydalanuvchi va bitta to'plam uchun tanlovchi: daraxtda faqat foydalanuvchi
+# ko'rgan savollar turadi (m ta), ko'rilmaganlari (n - m ta) bir xil og'irlik bilan
+# tasodifiy indeks orqali olinadi. Javob kelganda observe() bilan yangilanadi.
+class PoolSampler:
+    def __init__(self, size: int, locate, history: dict = None, recent_window: float = 6 * 3600):
+        self.size = size
+        self.locate = locate
+        self.recent_window = recent_window
+        self._tree = FenwickTree()
+        self._slots = []  # daraxt indeksi -> [to'plam indeksi, oxirgi ko'rilgan vaqt]
+        self._slot_of = {}  # to'plam indeksi -> daraxt indeksi
+        for item, state in (history or {}).items():
+            self.observe(item, state)
+
+    def observe(self, item: str, state):
+        index = self.locate(item)
+        if index is None or not 0 <= index < self.size:
+            return
+        _, _, attempts, errors, seen_at = state
+        weight = item_weight(attempts, errors)
+        slot = self._slot_of.get(index)
+        if slot is None:
+            self._slot_of[index] = self._tree.append(weight)
+            self._slots.append([index, seen_at])
+        else:
+            self._tree.set(slot, weight)
+            self._slots[slot][1] = seen_at
+
+    def _draw_unseen(self, chosen: set):
+        for _ in range(32):
+            index = random.randrange(self.size)
+            if index not in self._slot_of and index not in chosen:
+                return index
+        # Savollarning ko'pi ko'rilgan bo'lsa, qolganlaridan ochiq ro'yxat bilan
+        return random.choice([i for i in range(self.size) if i not in self._slot_of and i not in chosen])
+
+    def sample(self, count: int, now: float = None):
+        now = time.time() if now is None else now
+        count = min(count, self.size)
+        chosen, order, zeroed = set(), [], []
+        unseen_left = self.size - len(self._slots)
+        attempts_left = 20 * count + 100
+        try:
+            while len(order) < count:
+                # Nollangan og'irliklardan qolgan yaxlitlash xatosi hisobga olinmaydi
+                seen_total = self._tree.total
+                if seen_total < SEEN_WEIGHT / 2:
+                    seen_total = 0.0
+                value = random.random() * (seen_total + unseen_left)
+                if value < seen_total:
+                    slot = self._tree.find(value)
+                    index, seen_at = self._slots[slot]
+                    if index in chosen:
+                        continue
+                    attempts_left -= 1
+                    if attempts_left > 0 and random.random() >= recency_factor(seen_at, now, self.recent_window):
+                        continue
+                    zeroed.append((slot, self._tree.weights[slot]))
+                    self._tree.set(slot, 0.0)
+                elif unseen_left > 0:
+                    index = self._draw_unseen(chosen)
+                    unseen_left -= 1
+                else:
+                    break
+                chosen.add(index)
+                order.append(index)
+        finally:
+            for slot, weight in zeroed:
+                self._tree.set(slot, weight)
+        return order
@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import logging
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from content import RANDOM_POOL_ID
+from matching import normalize
+
+logger = logging.getLogger(__name__)
+
+MAX_POSTING = 5000  # juda ko'p so'zda uchraydigan trigramlar noaniq qidiruvda hisobga olinmaydi
+MIN_SIMILARITY = 0.35
+
+def _ngrams(text: str, n: int = 3):
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+class _SearchData:
+    __slots__ = ("version", "entries", "terms", "postings", "grams")
+
+    def __init__(self, version, entries, terms, postings, grams):
+        self.version = version
+        self.entries = entries  # [(pool_id, savol, javob)]
+        self.terms = terms  # saralangan normallashtirilgan kalitlar (savol, javob va ularning so'zlari)
+        self.postings = postings  # terms[i] uchraydigan yozuvlar: array('I')
+        self.grams = grams  # trigram -> array('I') term indekslari
+
+
+def _build(snapshot):
+    entries, term_entries = [], defaultdict(set)
+    for pool_id, pool in snapshot.pools.items():
+        if pool_id == RANDOM_POOL_ID:
+            continue
+        for question, answer in pool.items:
+            entry_id = len(entries)
+            entries.append((pool_id, question, str(answer)))
+            for text in (question, answer):
+                normalized = normalize(text)
+                if not normalized:
+                    continue
+                term_entries[normalized].add(entry_id)
+                for word in normalized.replace(",", " ").replace("/", " ").split():
+                    term_entries[word].add(entry_id)
+    terms = sorted(term_entries)
+    postings = [array("I", sorted(term_entries[term])) for term in terms]
+    grams = defaultdict(list)
+    for term_id, term in enumerate(terms):
+        for gram in _ngrams(term):
+            grams[gram].append(term_id)
+    grams = {gram: array("I", term_ids) for gram, term_ids in grams.items()}
+    return _SearchData(snapshot.version, entries, terms, postings, grams)
+
+
+# Lug'atlar va grammatika bo'yicha qidiruv: ikki yo'nalishda (savol va javob),
+# normallashtirilgan kalitlarning saralangan ro'yxati prefiks qidiruvi uchun,
+# trigram indeksi esa xato yozilgan so'rovlar uchun. Indeks kontent yangilanganda
+# fonda qayta quriladi, tayyor bo'lguncha eski versiya bilan ishlaydi.
+class SearchIndex:
+    def __init__(self):
+        self._data = None
+        self._latest = None
+        self._tasks = set()
+
+    @property
+    def ready(self):
+        return self._data is not None
+
+    def _prefix_terms(self, data: _SearchData, query: str, limit: int):
+        # Prefiks bilan boshlanadigan barcha kalitlar oralig'idan eng qisqa limit tasi
+        # (aniq moslik va so'z boshi oldinda), alifbo tartibida kesib tashlanmaydi
+        start = bisect_left(data.terms, query)
+        end = bisect_right(data.terms, query + "\U0010ffff", start)
+        return heapq.nsmallest(limit, range(start, end), key=lambda term_id: (len(data.terms[term_id]), term_id))
+
+    def _fuzzy_terms(self, data: _SearchData, query: str, limit: int):
+        query_grams = _ngrams(query)
+        overlaps = defaultdict(int)
+        for gram in query_grams:
+            term_ids = data.grams.get(gram)
+            if term_ids is not None and len(term_ids) <= MAX_POSTING:
+                for term_id in term_ids:
+                    overlaps[term_id] += 1
+        scored = []
+        for term_id, overlap in overlaps.items():
+            term = data.terms[term_id]
+            similarity = 2 * overlap / (len(query_grams) + len(_ngrams(term)))
+            if similarity >= MIN_SIMILARITY:
+                scored.append((similarity, -len(term), term_id))
+        return [term_id for _, _, term_id in heapq.nlargest(limit, scored)]
+
+    def search(self, query: str, limit: int = 10):
+        # Natija: [(pool_id, savol, javob)] - avval aniq va prefiks, keyin noaniq mosliklar
+        data = self._data
+        query = normalize(query)
+        if data is None or not query:
+            return []
+        term_ids = self._prefix_terms(data, query, 10 * limit)
+        if len(term_ids) < limit and len(query) >= 3:
+            term_ids += self._fuzzy_terms(data, query, 10 * limit)
+        results, seen = [], set()
+        for term_id in term_ids:
+            for entry_id in data.postings[term_id]:
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    results.append(data.entries[entry_id])
+                    if len(results) == limit:
+                        return results
+        return results
+
+    async def _update(self, snapshot):
+        started = time.perf_counter()
+        data = await asyncio.to_thread(_build, snapshot)
+        if data.version != self._latest:
+            return  # bu orada yangiroq versiya kelgan
+        self._data = data
+        logger.info(
+            f"Qidiruv indeksi tayyor: {len(data.entries)} ta yozuv, {len(data.terms)} ta kalit "
+            f"({(time.perf_counter() - started) * 1000:.0f} ms)"
+        )
+
+    def update(self, snapshot):
+        # ContentStore.on_reload listeneri: event loop ishlayotgan bo'lsa fonda quriladi
+        self._latest = snapshot.version
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._data = _build(snapshot)
+            return
+        task = asyncio.create_task(self._update(snapshot))
+        self._tasks.add(task)
+        task.add_done_callback(self._update_done)
+
+    def _update_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Qidiruv indeksini qurishda xato: {task.exception()}")
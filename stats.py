@@ -0,0 +1,189 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+
+from storage import load_json, save_to_json
+
+logger = logging.getLogger(__name__)
+
+# HyperLogLog: noyob foydalanuvchilar sonini 2^precision baytda taxminlaydi
+# (precision=11 da ~2 KB, xatolik ~2.3%). Kunlik sketchlar birlashtirilib WAU/MAU olinadi
+class HyperLogLog:
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 11, registers: bytes = None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers else bytearray(1 << precision)
+
+    def add(self, value):
+        digest = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+        bits = 64 - self.precision
+        index = digest >> bits
+        rank = bits - (digest & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Kichik qiymatlar uchun chiziqli hisoblash aniqroq
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
+
+    def to_json(self):
+        return base64.b64encode(bytes(self.registers)).decode()
+
+    @classmethod
+    def from_json(cls, data: str, precision: int = 11):
+        registers = base64.b64decode(data)
+        if len(registers) != 1 << precision:
+            return cls(precision)
+        return cls(precision, registers)
+
+
+# Space-Saving: eng ko'p uchraydigan k ta element. capacity ta hisoblagich saqlanadi,
+# joy tugasa eng kichik hisoblagich yangi elementga beriladi (xatosi - o'sha qiymat)
+class TopK:
+    __slots__ = ("capacity", "counters")
+
+    def __init__(self, capacity: int = 200, counters: dict = None):
+        self.capacity = capacity
+        self.counters = {item: list(value) for item, value in (counters or {}).items()}  # item -> [soni, xato]
+
+    def add(self, item: str, count: int = 1):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            return
+        victim = min(self.counters, key=lambda key: self.counters[key][0])
+        floor = self.counters.pop(victim)[0]
+        self.counters[item] = [floor + count, floor]
+
+    def top(self, k: int = 10):
+        return sorted(((item, value[0]) for item, value in self.counters.items()), key=lambda x: -x[1])[:k]
+
+
+# Admin statistikasi: voqealar sodir bo'lganda yangilanadigan hisoblagichlar va
+# sketchlar, fayl qayta o'qilmaydi. Holat har flush_interval sekundda stats.json ga yoziladi
+class Stats:
+    def __init__(self, filename: str = "stats.json", flush_interval: float = 60.0,
+                 keep_days: int = 30, precision: int = 11, top_capacity: int = 200):
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.keep_days = keep_days
+        self.precision = precision
+        self.daily_users = {}  # "YYYY-MM-DD" -> HyperLogLog
+        self.started = defaultdict(int)  # "bo'lim:daraja" -> soni
+        self.finished = defaultdict(int)
+        self.answers = defaultdict(lambda: [0, 0])  # lug'at/bo'lim -> [javoblar, to'g'ri]
+        self.missed = TopK(top_capacity)
+        self._dirty = False
+        self._flush_task = None
+
+    @staticmethod
+    def quiz_key(section: str, level: str = None):
+        return f"{section}:{level}" if level else section
+
+    def user_active(self, user_id: int, today: date = None):
+        day = (today or date.today()).isoformat()
+        sketch = self.daily_users.get(day)
+        if sketch is None:
+            sketch = self.daily_users[day] = HyperLogLog(self.precision)
+            self._trim(day)
+        if sketch.add(user_id):
+            self._dirty = True
+
+    def _trim(self, day: str):
+        oldest = (date.fromisoformat(day) - timedelta(days=self.keep_days - 1)).isoformat()
+        for old in [d for d in self.daily_users if d < oldest]:
+            del self.daily_users[old]
+
+    def quiz_started(self, section: str, level: str = None):
+        self.started[self.quiz_key(section, level)] += 1
+        self._dirty = True
+
+    def quiz_finished(self, section: str, level: str = None):
+        self.finished[self.quiz_key(section, level)] += 1
+        self._dirty = True
+
+    def answer(self, name: str, question: str, correct: bool):
+        counter = self.answers[name]
+        counter[0] += 1
+        counter[1] += 1 if correct else 0
+        if not correct:
+            self.missed.add(question)
+        self._dirty = True
+
+    def active_users(self, days: int, today: date = None):
+        today = today or date.today()
+        union = HyperLogLog(self.precision)
+        for offset in range(days):
+            sketch = self.daily_users.get((today - timedelta(days=offset)).isoformat())
+            if sketch is not None:
+                union.merge(sketch)
+        return union.count()
+
+    def snapshot(self):
+        return {
+            'daily_users': {day: sketch.to_json() for day, sketch in self.daily_users.items()},
+            'started': dict(self.started),
+            'finished': dict(self.finished),
+            'answers': {name: list(counter) for name, counter in self.answers.items()},
+            'missed': {item: list(value) for item, value in self.missed.counters.items()},
+        }
+
+    async def load(self):
+        data = await load_json(self.filename, {}) or {}
+        self.daily_users = {
+            day: HyperLogLog.from_json(registers, self.precision)
+            for day, registers in data.get('daily_users', {}).items()
+        }
+        self.started.update(data.get('started', {}))
+        self.finished.update(data.get('finished', {}))
+        for name, counter in data.get('answers', {}).items():
+            self.answers[name] = list(counter)
+        self.missed = TopK(self.missed.capacity, data.get('missed'))
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        await save_to_json(self.filename, self.snapshot())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Statistikani saqlashda xato: {e}")
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
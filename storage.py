@@ -0,0 +1,550 @@
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import asyncio
+import logging
+import sqlite3
+from bisect import bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Fayl bilan ishlash
+def _write_json_atomic(filename: str, data):
+    # Avval vaqtinchalik faylga yozib, fsync qilib, keyin rename qilamiz:
+    # jarayon yiqilsa ham fayl yo eski, yo yangi holatda qoladi
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def _read_json(filename: str):
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# Har bir fayl uchun bitta yozuvchi: navbatdagi yozuvlar birlashtiriladi — N ta
+# kutayotgan save_to_json faqat oxirgi ma'lumotni bir marta yozadi. Yozish alohida
+# task'da ishlaydi, shuning uchun chaqiruvchi bekor qilinsa ham navbat to'xtamaydi.
+# lock faqat faylning o'zini o'qish/yozish paytida ushlanadi (load_json ham uni oladi)
+class _JsonFileWriter:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.lock = asyncio.Lock()
+        self._latest = None
+        self._waiters = []
+        self._inflight = []
+        self._task = None
+
+    async def write(self, data):
+        waiter = asyncio.get_running_loop().create_future()
+        self._latest = data
+        self._waiters.append(waiter)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+            self._task.add_done_callback(self._drain_done)
+        return await waiter
+
+    async def _drain(self):
+        while self._waiters:
+            data, self._inflight = self._latest, self._waiters
+            self._latest, self._waiters = None, []
+            try:
+                async with self.lock:
+                    await asyncio.to_thread(_write_json_atomic, self.filename, data)
+            except Exception as e:
+                for w in self._inflight:
+                    if not w.done():
+                        w.set_exception(e)
+            else:
+                for w in self._inflight:
+                    if not w.done():
+                        w.set_result(len(self._inflight))
+            self._inflight = []
+
+    def _drain_done(self, task: asyncio.Task):
+        # Task bekor qilinsa (masalan, event loop yopilganda) hech kim abadiy kutib qolmasin.
+        # Bu orada yangi task boshlangan bo'lsa, navbatdagilar endi uniki
+        if not task.cancelled() and task.exception() is None:
+            return
+        waiters, self._inflight = self._inflight, []
+        if task is self._task:
+            waiters, self._waiters = waiters + self._waiters, []
+        for w in waiters:
+            if not w.done():
+                w.set_exception(RuntimeError(f"{self.filename} yozish to'xtatildi"))
+
+_json_writers = {}
+
+def _get_writer(filename: str):
+    key = os.path.abspath(filename)
+    writer = _json_writers.get(key)
+    if writer is None:
+        writer = _json_writers[key] = _JsonFileWriter(filename)
+    return writer
+
+async def save_to_json(filename: str, data: list):
+    try:
+        coalesced = await _get_writer(filename).write(data)
+        logger.debug(f"{filename} fayliga ma'lumot saqlandi ({coalesced} ta yozuv birlashtirildi)")
+    except Exception as e:
+        logger.error(f"{filename} saqlashda xato: {e}")
+
+async def write_json(filename: str, data):
+    # save_to_json'dan farqi: xato chaqiruvchiga qaytadi (backendlar qayta urinishi uchun)
+    return await _get_writer(filename).write(data)
+
+async def load_json(filename: str, default=None):
+    try:
+        if os.path.exists(filename):
+            async with _get_writer(filename).lock:
+                return await asyncio.to_thread(_read_json, filename)
+        logger.warning(f"{filename} fayli topilmadi, default qiymat ishlatiladi")
+        return default or []
+    except Exception as e:
+        logger.error(f"{filename} yuklashda xato: {e}")
+        return default or []
+
+def _append_jsonl(filename: str, record: dict):
+    with open(filename, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def _read_jsonl(filename: str):
+    # Eski yozuvlarda id bo'lmasa, qator raqami id hisoblanadi
+    records = []
+    if not os.path.exists(filename):
+        return records
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                record = json.loads(line)
+                record.setdefault('id', line_number)
+                records.append(record)
+    return records
+
+# Saqlash backendlari
+#
+# Har bir backend bir xil async interfeysga ega:
+#   load_user_ids() -> set, get_user(id), upsert_users(users), delete_users(ids),
+#   count_users(active_since=None), iter_users(active_since=None, after_id=None, batch_size=500),
+#   add_feedback(record) -> id, load_feedback(after_id=None) -> [record], last_feedback_id(),
+#   add_quiz_result(record),
+#   load_reviews(user_id) -> [(item, box, due, attempts, errors, seen_at)],
+#   save_reviews(upserts, deletes), close()
+# upsert_users ga username=None kelsa, mavjud username saqlanib qoladi.
+# iter_users foydalanuvchilarni id bo'yicha o'sish tartibida qaytaradi.
+
+class JsonBackend:
+    def __init__(self, users_file: str = 'users.json', feedback_file: str = 'feedback.jsonl',
+                 history_file: str = 'quiz_history.jsonl', reviews_dir: str = 'reviews',
+                 legacy_reviews_file: str = 'reviews.json'):
+        self.users_file = users_file
+        self.feedback_file = feedback_file
+        self.history_file = history_file
+        self.reviews_dir = reviews_dir
+        self.legacy_reviews_file = legacy_reviews_file
+        self._users = {}
+        self._sorted_ids = None  # iter_users uchun saralangan id'lar, o'chirilganda qayta quriladi
+        self._reviews_ready = False
+        self._last_feedback_id = None
+        self._feedback_lock = asyncio.Lock()
+
+    async def load_user_ids(self):
+        users = await load_json(self.users_file, [])
+        self._users = {u['id']: u for u in users}
+        self._sorted_ids = None
+        return set(self._users)
+
+    async def get_user(self, user_id: int):
+        return self._users.get(user_id)
+
+    async def upsert_users(self, users: list):
+        for record in users:
+            user = self._users.get(record['id'])
+            if user is None:
+                self._users[record['id']] = {
+                    'id': record['id'],
+                    'username': record['username'] or 'Nomalum',
+                    'last_active': record['last_active']
+                }
+                if self._sorted_ids is not None:
+                    insort(self._sorted_ids, record['id'])
+            else:
+                user['username'] = record['username'] or user.get('username', 'Nomalum')
+                user['last_active'] = record['last_active']
+        await write_json(self.users_file, [dict(u) for u in self._users.values()])
+
+    async def delete_users(self, user_ids):
+        for user_id in user_ids:
+            self._users.pop(user_id, None)
+        self._sorted_ids = None
+        await write_json(self.users_file, [dict(u) for u in self._users.values()])
+
+    async def count_users(self, active_since: str = None):
+        if active_since is None:
+            return len(self._users)
+        return sum(1 for u in self._users.values() if u.get('last_active', '') >= active_since)
+
+    async def iter_users(self, active_since: str = None, after_id: int = None, batch_size: int = 500):
+        # Keyingi id har safar bisect bilan topiladi: ro'yxat iteratsiya orasida o'zgarsa ham to'g'ri
+        while True:
+            if self._sorted_ids is None:
+                self._sorted_ids = sorted(self._users)
+            ids = self._sorted_ids
+            position = 0 if after_id is None else bisect_right(ids, after_id)
+            if position >= len(ids):
+                return
+            after_id = ids[position]
+            user = self._users.get(after_id)
+            if user is not None and (active_since is None or user.get('last_active', '') >= active_since):
+                yield user
+
+    async def last_feedback_id(self):
+        if self._last_feedback_id is None:
+            records = await asyncio.to_thread(_read_jsonl, self.feedback_file)
+            last_id = max((r['id'] for r in records), default=0)
+            if self._last_feedback_id is None:
+                self._last_feedback_id = last_id
+        return self._last_feedback_id
+
+    async def add_feedback(self, record: dict):
+        # id ajratish va faylga yozish bitta lock ostida: bir vaqtdagi fikrlar bir xil id
+        # olmaydi va faylda id tartibida turadi
+        async with self._feedback_lock:
+            self._last_feedback_id = await self.last_feedback_id() + 1
+            record = {'id': self._last_feedback_id, **record}
+            await asyncio.to_thread(_append_jsonl, self.feedback_file, record)
+        return record['id']
+
+    async def load_feedback(self, after_id: int = None):
+        records = await asyncio.to_thread(_read_jsonl, self.feedback_file)
+        return sorted((r for r in records if after_id is None or r['id'] > after_id), key=lambda r: r['id'])
+
+    async def add_quiz_result(self, record: dict):
+        await asyncio.to_thread(_append_jsonl, self.history_file, record)
+
+    # Takrorlash navbatlari har bir foydalanuvchi uchun alohida faylda (reviews/<id>.json):
+    # flush faqat o'zgargan foydalanuvchilar fayllarini qayta yozadi
+    def _reviews_path(self, user_id):
+        return os.path.join(self.reviews_dir, f"{user_id}.json")
+
+    async def _prepare_reviews(self):
+        if self._reviews_ready:
+            return
+        if not os.path.isdir(self.reviews_dir):
+            await asyncio.to_thread(os.makedirs, self.reviews_dir, exist_ok=True)
+            if os.path.exists(self.legacy_reviews_file):
+                # Eski yagona reviews.json bir marta foydalanuvchilar bo'yicha bo'linadi
+                legacy = await load_json(self.legacy_reviews_file, {}) or {}
+                for user_id, items in legacy.items():
+                    await write_json(self._reviews_path(user_id), items)
+                await asyncio.to_thread(os.replace, self.legacy_reviews_file, f"{self.legacy_reviews_file}.migrated")
+                logger.info(f"{self.legacy_reviews_file} {len(legacy)} ta foydalanuvchi fayliga bo'lindi")
+        self._reviews_ready = True
+
+    async def _read_reviews(self, user_id):
+        await self._prepare_reviews()
+        path = self._reviews_path(user_id)
+        if not os.path.exists(path):
+            return {}
+        return await load_json(path, {}) or {}
+
+    async def load_reviews(self, user_id: int):
+        reviews = await self._read_reviews(user_id)
+        return [(item, *state) for item, state in reviews.items()]
+
+    async def save_reviews(self, upserts: list, deletes: list):
+        changes = {}
+        for user_id, item, *state in upserts:
+            changes.setdefault(user_id, {})[item] = state
+        for user_id, item in deletes:
+            changes.setdefault(user_id, {})[item] = None
+        for user_id, items in changes.items():
+            reviews = await self._read_reviews(user_id)
+            for item, state in items.items():
+                if state is None:
+                    reviews.pop(item, None)
+                else:
+                    reviews[item] = state
+            if reviews:
+                await write_json(self._reviews_path(user_id), reviews)
+            else:
+                with contextlib.suppress(FileNotFoundError):
+                    await asyncio.to_thread(os.remove, self._reviews_path(user_id))
+
+    async def close(self):
+        pass
+
+
+class SqliteBackend:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL DEFAULT 'Nomalum',
+            last_active TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_last_active ON users(last_active);
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            text TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_feedback_user ON feedback(user_id);
+        CREATE TABLE IF NOT EXISTS quiz_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            section TEXT NOT NULL,
+            name TEXT,
+            level TEXT,
+            total INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            finished_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_quiz_history_user ON quiz_history(user_id, finished_at);
+        CREATE TABLE IF NOT EXISTS reviews (
+            user_id INTEGER NOT NULL,
+            item TEXT NOT NULL,
+            box INTEGER,
+            due REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            seen_at REAL,
+            PRIMARY KEY (user_id, item)
+        ) WITHOUT ROWID;
+    """
+    # Yangi foydalanuvchiga username bo'lmasa 'Nomalum' yoziladi, mavjudida esa eski username qoladi
+    UPSERT_USER = """
+        INSERT INTO users (id, username, last_active) VALUES (?1, COALESCE(?2, 'Nomalum'), ?3)
+        ON CONFLICT(id) DO UPDATE SET
+            username = COALESCE(?2, users.username),
+            last_active = ?3
+    """
+    DELETE_USER = "DELETE FROM users WHERE id = ?"
+    SELECT_USER = "SELECT id, username, last_active FROM users WHERE id = ?"
+    PAGE_USERS = "SELECT id, username, last_active FROM users WHERE id > ? ORDER BY id LIMIT ?"
+    PAGE_ACTIVE_USERS = (
+        "SELECT id, username, last_active FROM users WHERE last_active >= ? AND id > ? ORDER BY id LIMIT ?"
+    )
+    INSERT_FEEDBACK = "INSERT INTO feedback (user_id, username, text, created_at) VALUES (?, ?, ?, ?)"
+    SELECT_FEEDBACK = "SELECT id, user_id, username, text, created_at FROM feedback WHERE id > ? ORDER BY id"
+    INSERT_QUIZ_RESULT = (
+        "INSERT INTO quiz_history (user_id, section, name, level, total, correct, finished_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)"
+    )
+    SELECT_REVIEWS = "SELECT item, box, due, attempts, errors, seen_at FROM reviews WHERE user_id = ?"
+    UPSERT_REVIEW = """
+        INSERT INTO reviews (user_id, item, box, due, attempts, errors, seen_at) VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7)
+        ON CONFLICT(user_id, item) DO UPDATE SET box = ?3, due = ?4, attempts = ?5, errors = ?6, seen_at = ?7
+    """
+    DELETE_REVIEW = "DELETE FROM reviews WHERE user_id = ? AND item = ?"
+
+    def __init__(self, path: str = 'bot.db', import_users_from: str = 'users.json'):
+        self.path = path
+        self.import_users_from = import_users_from
+        # sqlite3 ulanishi bitta ishchi thread'da ishlaydi, shuning uchun so'rovlar
+        # o'z-o'zidan navbatga tushadi va event loop bloklanmaydi
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def _load_user_ids(self):
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None and os.path.exists(self.import_users_from):
+            self._import_users(self.import_users_from)
+        return {row[0] for row in conn.execute("SELECT id FROM users")}
+
+    def _import_users(self, filename: str):
+        with open(filename, 'r', encoding='utf-8') as f:
+            users = json.load(f)
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                self.UPSERT_USER,
+                ((u['id'], u.get('username') or None, u.get('last_active')) for u in users)
+            )
+        logger.info(f"{filename} dan {len(users)} ta foydalanuvchi import qilindi")
+        return len(users)
+
+    def _export_users(self, filename: str):
+        conn = self._connect()
+        users = [
+            {'id': row[0], 'username': row[1], **({'last_active': row[2]} if row[2] else {})}
+            for row in conn.execute("SELECT id, username, last_active FROM users ORDER BY id")
+        ]
+        tmp = f"{filename}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(users, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, filename)
+        logger.info(f"{len(users)} ta foydalanuvchi {filename} ga eksport qilindi")
+        return len(users)
+
+    def _get_user(self, user_id: int):
+        row = self._connect().execute(self.SELECT_USER, (user_id,)).fetchone()
+        return {'id': row[0], 'username': row[1], 'last_active': row[2]} if row else None
+
+    def _upsert_users(self, users: list):
+        conn = self._connect()
+        with conn:
+            conn.executemany(self.UPSERT_USER, ((u['id'], u['username'], u['last_active']) for u in users))
+
+    def _delete_users(self, user_ids):
+        conn = self._connect()
+        with conn:
+            conn.executemany(self.DELETE_USER, ((user_id,) for user_id in user_ids))
+
+    def _count_users(self, active_since: str = None):
+        conn = self._connect()
+        if active_since is None:
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM users WHERE last_active >= ?", (active_since,)).fetchone()[0]
+
+    def _page_users(self, after_id: int, limit: int, active_since: str = None):
+        conn = self._connect()
+        if active_since is None:
+            rows = conn.execute(self.PAGE_USERS, (after_id, limit)).fetchall()
+        else:
+            rows = conn.execute(self.PAGE_ACTIVE_USERS, (active_since, after_id, limit)).fetchall()
+        return [{'id': r[0], 'username': r[1], 'last_active': r[2]} for r in rows]
+
+    def _load_reviews(self, user_id: int):
+        return self._connect().execute(self.SELECT_REVIEWS, (user_id,)).fetchall()
+
+    def _save_reviews(self, upserts: list, deletes: list):
+        conn = self._connect()
+        with conn:
+            conn.executemany(self.UPSERT_REVIEW, upserts)
+            conn.executemany(self.DELETE_REVIEW, deletes)
+
+    def _insert(self, sql: str, params: tuple):
+        conn = self._connect()
+        with conn:
+            return conn.execute(sql, params).lastrowid
+
+    def _load_feedback(self, after_id: int = None):
+        rows = self._connect().execute(self.SELECT_FEEDBACK, (after_id or 0,)).fetchall()
+        return [
+            {'id': r[0], 'user_id': r[1], 'username': r[2], 'text': r[3], 'created_at': r[4]}
+            for r in rows
+        ]
+
+    def _last_feedback_id(self):
+        return self._connect().execute("SELECT COALESCE(MAX(id), 0) FROM feedback").fetchone()[0]
+
+    async def load_user_ids(self):
+        return await self._run(self._load_user_ids)
+
+    async def get_user(self, user_id: int):
+        return await self._run(self._get_user, user_id)
+
+    async def upsert_users(self, users: list):
+        await self._run(self._upsert_users, users)
+
+    async def delete_users(self, user_ids):
+        await self._run(self._delete_users, list(user_ids))
+
+    async def count_users(self, active_since: str = None):
+        return await self._run(self._count_users, active_since)
+
+    async def iter_users(self, active_since: str = None, after_id: int = None, batch_size: int = 500):
+        after_id = -sys.maxsize if after_id is None else after_id
+        while True:
+            page = await self._run(self._page_users, after_id, batch_size, active_since)
+            for user in page:
+                yield user
+            if len(page) < batch_size:
+                return
+            after_id = page[-1]['id']
+
+    async def add_feedback(self, record: dict):
+        return await self._run(self._insert, self.INSERT_FEEDBACK, (
+            record['user_id'], record.get('username'), record['text'], record['created_at']
+        ))
+
+    async def load_feedback(self, after_id: int = None):
+        return await self._run(self._load_feedback, after_id)
+
+    async def last_feedback_id(self):
+        return await self._run(self._last_feedback_id)
+
+    async def add_quiz_result(self, record: dict):
+        await self._run(self._insert, self.INSERT_QUIZ_RESULT, (
+            record['user_id'], record['section'], record.get('name'), record.get('level'),
+            record['total'], record['correct'], record['finished_at']
+        ))
+
+    async def load_reviews(self, user_id: int):
+        return await self._run(self._load_reviews, user_id)
+
+    async def save_reviews(self, upserts: list, deletes: list):
+        await self._run(self._save_reviews, upserts, deletes)
+
+    async def import_users(self, filename: str):
+        return await self._run(self._import_users, filename)
+
+    async def export_users(self, filename: str):
+        return await self._run(self._export_users, filename)
+
+    async def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
+
+
+def create_backend(kind: str = 'json', database_path: str = 'bot.db', users_file: str = 'users.json'):
+    if kind == 'sqlite':
+        return SqliteBackend(database_path, import_users_from=users_file)
+    if kind != 'json':
+        logger.warning(f"Noma'lum STORAGE_BACKEND={kind}, json ishlatiladi")
+    return JsonBackend(users_file)
+
+
+# users.json <-> SQLite import/eksport:
+#   python storage.py import bot.db users.json
+#   python storage.py export bot.db users.json
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Foydalanish: python storage.py import|export <bot.db> <users.json>")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def _cli(command: str, database_path: str, filename: str):
+        backend = SqliteBackend(database_path, import_users_from=filename)
+        try:
+            if command == "import":
+                await backend.import_users(filename)
+            else:
+                await backend.export_users(filename)
+        finally:
+            await backend.close()
+
+    asyncio.run(_cli(*sys.argv[1:]))
@@ -0,0 +1,122 @@
+import asyncio
+import heapq
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Savol taymerlari uchun markaziy rejalashtiruvchi: barcha sessiyalarning
+# muddatlari bitta heap'da turadi va ularni bitta task kuzatadi.
+# Bekor qilish O(1): yozuv faqat "bekor qilingan" deb belgilanadi va heap'dan
+# navbati kelganda tashlab yuboriladi.
+class QuizTimer:
+    __slots__ = ("key", "deadline", "marks", "on_tick", "on_expire", "countdown", "cancelled")
+
+    def __init__(self, key, deadline: float, marks, on_tick, on_expire):
+        self.key = key
+        self.deadline = deadline
+        self.marks = list(marks)  # qolgan sekundlar, kamayish tartibida
+        self.on_tick = on_tick
+        self.on_expire = on_expire
+        self.countdown = None
+        self.cancelled = False
+
+    def next_fire_at(self):
+        if self.marks:
+            return self.deadline - self.marks[0]
+        return self.deadline
+
+
+class TimerScheduler:
+    def __init__(self):
+        self._heap = []
+        self._timers = {}
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._callbacks = set()
+
+    def __len__(self):
+        return len(self._timers)
+
+    @property
+    def pending_callbacks(self):
+        return len(self._callbacks)
+
+    def get(self, key):
+        return self._timers.get(key)
+
+    def schedule(self, key, delay: float, marks=(), on_tick=None, on_expire=None):
+        self.cancel(key)
+        loop = asyncio.get_running_loop()
+        marks = sorted((m for m in marks if 0 < m < delay), reverse=True)
+        timer = QuizTimer(key, loop.time() + delay, marks if on_tick else (), on_tick, on_expire)
+        self._timers[key] = timer
+        self._push(timer)
+        return timer
+
+    def cancel(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancelled = True
+        return timer
+
+    def _push(self, timer: QuizTimer):
+        fire_at = timer.next_fire_at()
+        heapq.heappush(self._heap, (fire_at, next(self._seq), timer))
+        if self._wakeup is not None and self._heap[0][2] is timer:
+            self._wakeup.set()
+
+    def _run_callback(self, callback, *args):
+        task = asyncio.create_task(callback(*args))
+        self._callbacks.add(task)
+        task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task):
+        self._callbacks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Taymer callback'ida xato: {task.exception()}")
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - loop.time())
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, timer = heapq.heappop(self._heap)
+            if timer.marks:
+                remaining = timer.marks.pop(0)
+                self._push(timer)
+                self._run_callback(timer.on_tick, timer, remaining)
+            else:
+                self._timers.pop(timer.key, None)
+                if timer.on_expire is not None:
+                    self._run_callback(timer.on_expire, timer)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._callbacks):
+            task.cancel()
+        self._heap.clear()
+        self._timers.clear()